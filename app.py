@@ -1,58 +1,151 @@
 from flask import (
-    Flask, render_template, request,
-    redirect, send_from_directory, session, flash, jsonify, send_file
+    Flask, render_template, request, g,
+    redirect, session, flash, jsonify, send_file
 )
-import sqlite3, io
-from datetime import datetime, date
-from apscheduler.schedulers.background import BackgroundScheduler
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-
-from scheduler import auto_expire_reserved, send_reminders
+import hmac
+import io
+import os
+import threading
+from datetime import datetime, date, timedelta
+
+from database import pool, immediate
+from init_db import migrate
+from booking import reserve_slot, SlotUnavailable
+from dashboard import (
+    appointment_page, appointment_filters, slot_page, page_size,
+    dashboard_stats, daily_breakdown, CursorError
+)
+from search import search_appointments
+from schedules import (
+    ScheduleError, parse_schedule, preview_schedule, expand, split_overlaps,
+    save_rule, active_rules, remove_slot, slot_key, slots_between
+)
+from receipts import (
+    receipt_cache, receipt_renderer, export_renderer, export_receipts,
+    RenderBusy, EXPORT_LIMIT
+)
+from settings import settings_cache, update_settings
+from messages import (
+    reservation_link, confirmation_link, cancel_link, clear_compiled,
+    render_text, reservation_values, confirmation_values
+)
+from outbox import enqueue, outbox_stats
+from metrics import (
+    request_started, request_finished, register_collector, render as render_metrics
+)
+from uploads import (
+    UploadRequest, UPLOAD_FOLDER, MAX_FILE_BYTES,
+    MAX_APPOINTMENT_BYTES, MAX_APPOINTMENT_FILES,
+    SENDFILE_MODE, allowed_file, store_spool, appointment_usage,
+    find_report, report_response
+)
+from availability import (
+    slot_cache, slot_events, slots_claimed, slots_freed, slots_changed,
+    stream_events, StreamsFull, SLOT_STREAM
+)
+from scheduler import OutboxWorker, JobRunner
 
 app = Flask(__name__,static_folder="static")
 app.secret_key = "medbuddy-secret"
 
-DB = "medbuddy.db"
-
 # ---------------- DB HELPER ----------------
 def db():
-    conn = sqlite3.connect(
-        DB,
-        timeout=10,          # wait before failing
-        check_same_thread=False
+    """
+    Connection for the current request, borrowed from the pool
+    on first use and handed back on teardown.
+    """
+    if "db" not in g:
+        g.db = pool.acquire()
+    return g.db
+
+@app.teardown_appcontext
+def release_db(exc):
+    conn = g.pop("db", None)
+    if conn is not None:
+        pool.release(conn)
+
+
+# ---------------- METRICS ----------------
+# Prometheus text on /metrics, for the admin session or a scraper
+# sending "Authorization: Bearer <MEDBUDDY_METRICS_TOKEN>".
+# MEDBUDDY_METRICS_PUBLIC=1 opens it to anyone.
+METRICS_TOKEN = os.environ.get("MEDBUDDY_METRICS_TOKEN", "")
+METRICS_PUBLIC = os.environ.get("MEDBUDDY_METRICS_PUBLIC", "0") == "1"
+
+@app.before_request
+def start_request_timer():
+    g.request_started = request_started()
+
+@app.after_request
+def record_request_time(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        request_finished(
+            started,
+            request.endpoint or "unmatched",
+            request.method,
+            response.status_code
+        )
+    return response
+
+def _outbox_counts():
+    with pool.connection() as conn:
+        return outbox_stats(conn)
+
+register_collector("db_pool", pool.stats, "Connection pool counters.")
+register_collector("slot_cache", slot_cache.stats, "GET /slots cache.")
+register_collector("settings_cache", settings_cache.stats, "Cached admin_settings row.")
+register_collector("receipt_cache", receipt_cache.stats, "Rendered receipt cache.")
+register_collector("pdf_pool", receipt_renderer.stats, "Receipt render worker pool.")
+register_collector("outbox", _outbox_counts, "Outbox messages by status.")
+
+@app.route("/metrics")
+def metrics_endpoint():
+    scraper = METRICS_TOKEN and hmac.compare_digest(
+        request.headers.get("Authorization", ""), f"Bearer {METRICS_TOKEN}"
     )
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA journal_mode=WAL;")
-    conn.execute("PRAGMA busy_timeout = 5000;")
-    return conn
-
-
-# ---------------- CONFIRMATION CODE ----------------
-import uuid
-
-def generate_code():
-    return f"MB-{datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:4]}"
-
-#cancel
-def doctor_cancel_message(appt):
-    return (
-        f"Appointment Cancelled by Patient\n\n"
-        f"Confirmation No: {appt['confirmation_code']}\n"
-        f"Patient: {appt['patient_name']}\n"
-        f"Date: {appt['appointment_date']}\n"
-        f"Time: {appt['slot_time']}\n\n"
-        f"Please cancel/delete this appointment from admin panel."
+    if not (METRICS_PUBLIC or scraper or session.get("admin")):
+        return "Forbidden", 403
+    return app.response_class(
+        render_metrics(), mimetype="text/plain; version=0.0.4"
     )
+
+
+# ---------------- WHATSAPP LINKS ----------------
+# templates compile once; cards render each link in a single pass
+app.jinja_env.globals.update(
+    reservation_link=reservation_link,
+    confirmation_link=confirmation_link
+)
+
+# ---------------- NOTIFICATIONS ----------------
+def queue_patient_message(conn, kind, a):
+    """
+    Queue the reservation / confirmation message for appointment row
+    `a`, inside the caller's transaction. Only writes an outbox row
+    (no commit); the outbox worker sends it.
+    """
+    settings = settings_cache.get(conn)
+
+    if kind == "reservation":
+        body = render_text(settings.reservation_message,
+                           reservation_values(a, settings))
+    else:
+        body = render_text(settings.confirmation_message,
+                           confirmation_values(a, settings, request.url_root))
+
+    enqueue(conn, f"{kind}:{a['confirmation_code']}", kind, a["mobile"], body)
+
 # ----------------Upload ---------------
-def allowed_file(filename):
-    ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg', 'doc', 'docx'}
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS 
 import os
 from werkzeug.utils import secure_filename
-app.config["UPLOAD_FOLDER"] = "uploads"
-os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True) 
+app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
+os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
+
+# uploads stream into hashing temp files; see uploads.HashingSpool
+app.request_class = UploadRequest
+app.config["MAX_CONTENT_LENGTH"] = MAX_FILE_BYTES + 64 * 1024  # + form overhead
+app.config["USE_X_SENDFILE"] = SENDFILE_MODE == "apache"
 
 @app.route("/upload/<code>", methods=["GET", "POST"])
 def upload_reports(code):
@@ -66,7 +159,6 @@ def upload_reports(code):
     ).fetchone()
 
     if not appt:
-        conn.close()
         return "Invalid confirmation code", 404
 
     if request.method == "POST":
@@ -74,37 +166,69 @@ def upload_reports(code):
         file = request.files.get("report")
 
         if not file or file.filename == "":
-            conn.close()
             return render_template(
                 "upload_reports.html",
                 code=code,
                 error="Please select a file to upload."
             )
 
-        import os
-        from werkzeug.utils import secure_filename
-
         filename = secure_filename(file.filename)
 
-        upload_folder = "uploads"
-        os.makedirs(upload_folder, exist_ok=True)
-
-        file_path = os.path.join(upload_folder, filename)
-        file.save(file_path)
+        if not allowed_file(filename):
+            return render_template(
+                "upload_reports.html",
+                code=code,
+                error="Only PDF, image and Word files can be uploaded."
+            )
 
-        conn.execute("""
-            INSERT INTO medical_reports
-            (confirmation_code, file_name, file_path, uploaded_at)
-            VALUES (?, ?, ?, ?)
-        """, (
-            code,
-            filename,
-            file_path,
-            datetime.now().isoformat()
-        ))
+        spool = file.stream
+        ext = filename.rsplit(".", 1)[1].lower()
+
+        def store(conn):
+            # quota check and insert under one write lock, so parallel
+            # uploads can't both squeeze under the limit
+            files_used, bytes_used = appointment_usage(conn, code)
+
+            if (files_used >= MAX_APPOINTMENT_FILES
+                    or bytes_used + spool.size > MAX_APPOINTMENT_BYTES):
+                return "full"
+
+            duplicate = conn.execute("""
+                SELECT 1 FROM medical_reports
+                WHERE confirmation_code=? AND sha256=?
+            """, (code, spool.sha256)).fetchone()
+
+            if duplicate:
+                return "duplicate"
+
+            conn.execute("""
+                INSERT INTO medical_reports
+                (confirmation_code, appointment_id, file_name, file_path,
+                 sha256, size_bytes, uploaded_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (
+                code,
+                appt["id"],
+                filename,
+                store_spool(spool, ext),
+                spool.sha256,
+                spool.size,
+                datetime.now().isoformat()
+            ))
+            return "stored"
+
+        outcome = immediate(conn, store)
+
+        if outcome == "full":
+            return render_template(
+                "upload_reports.html",
+                code=code,
+                error="Upload limit reached for this appointment."
+            )
 
-        conn.commit()
-        conn.close()
+        if outcome == "stored":
+            # build the thumbnail now rather than on the next interval
+            job_runner.run_soon("report_previews")
 
         # ✅ Render success page
         return render_template(
@@ -113,7 +237,6 @@ def upload_reports(code):
             patient_name=appt["patient_name"]
         )
 
-    conn.close()
     return render_template("upload_reports.html", code=code)
 
 # ------- 
@@ -125,32 +248,114 @@ def admin_reports(code):
     conn = db()
 
     reports = conn.execute("""
-        SELECT * FROM medical_reports
+        SELECT * FROM medical_reports_all
         WHERE confirmation_code=?
         ORDER BY uploaded_at DESC
     """, (code,)).fetchall()
 
-    conn.close()
-
     return render_template(
         "admin_reports.html",
         reports=reports,
         code=code
     )
+
+@app.route("/admin/reports/preview/<int:id>")
+def report_preview(id):
+    if not session.get("admin"):
+        return redirect("/admin")
+
+    r = db().execute(
+        "SELECT preview_path FROM medical_reports_all WHERE id=? AND preview_status='ready'",
+        (id,)
+    ).fetchone()
+
+    if not r or not r["preview_path"]:
+        return "Preview not available", 404
+
+    response = send_file(
+        os.path.abspath(r["preview_path"]),
+        mimetype="image/jpeg",
+        conditional=True
+    )
+    response.cache_control.private = True
+    response.cache_control.no_cache = None
+    response.cache_control.max_age = 24 * 3600
+    return response
 # =================================================
 
-def send_from_directory(directory, filename):
-    return send_file(os.path.join(directory, filename))
 @app.route('/uploads/<path:filename>')
 def uploaded_file(filename):
-    return send_from_directory('uploads', filename)
+    if not session.get("admin"):
+        return redirect("/admin")
+
+    report = find_report(db(), filename)
+    if not report:
+        return "Report not found", 404
+
+    return report_response(report, filename)
 
 
 # ---------------- SCHEDULER ----------------
-scheduler = BackgroundScheduler()
-scheduler.add_job(auto_expire_reserved, "interval", minutes=10)
-scheduler.add_job(send_reminders, "interval", minutes=5)
-scheduler.start()
+# Every worker competes for the scheduler lease; exactly one runs
+# the periodic jobs. MEDBUDDY_SCHEDULER=off leaves them to a separate
+# `python scheduler.py` process.
+SCHEDULER_MODE = os.environ.get("MEDBUDDY_SCHEDULER", "leader")
+
+# request handlers only write outbox rows and wake this thread;
+# claims are leased, so one per worker is safe
+outbox_worker = OutboxWorker()
+
+job_runner = JobRunner()
+register_collector("scheduler", job_runner.stats, "Scheduler leadership of this process.")
+
+_started = False
+_start_lock = threading.Lock()
+
+def start_background():
+    """
+    Migrate the schema, start the PDF render workers and the outbox
+    and scheduler threads. Once per serving process; importing
+    this module starts nothing.
+    """
+    global _started
+    with _start_lock:
+        if _started:
+            return
+        _started = True
+
+        with pool.connection() as conn:
+            migrate(conn)
+
+        # warm the render workers now; the first download or export
+        # doesn't pay for it
+        receipt_renderer.start()
+        export_renderer.start()
+
+        outbox_worker.start()
+        if SCHEDULER_MODE != "off":
+            job_runner.start()
+
+@app.before_request
+def ensure_background():
+    # servers that load `app:app` directly (gunicorn app:app,
+    # flask run) start it here, on their first request
+    if not _started:
+        start_background()
+
+def create_app():
+    """
+    The app with its background work running, for server entry points:
+
+        gunicorn 'app:create_app()'     (or app:app: then it starts on
+                                         the first request; not with
+                                         --preload, the threads must
+                                         start in each worker)
+        flask run                       (first request)
+        uvicorn asgi:application        (lifespan startup)
+        python app.py
+    """
+    start_background()
+    return app
 
 # =================================================
 # PUBLIC
@@ -166,6 +371,8 @@ def patient_page():
 
 @app.after_request
 def add_cache_headers(response):
+    if request.endpoint in ("uploaded_file", "report_preview"):
+        return response   # reports carry their own private cache policy
     if response.content_type.startswith(("image/", "text/css", "application/javascript")):
         response.headers["Cache-Control"] = "public, max-age=31536000"
     return response
@@ -175,73 +382,64 @@ def add_cache_headers(response):
 # =================================================
 @app.route("/slots")
 def available_slots():
-    today = date.today().isoformat()
-    conn = db()
-    rows = conn.execute("""
-        SELECT * FROM slots
-        WHERE is_booked = 0
-        AND slot_date >= ?
-        ORDER BY slot_date, start_time
-    """, (today,)).fetchall()
-    conn.close()
-    return jsonify([dict(r) for r in rows])
+    body, etag = slot_cache.get()
+
+    response = app.response_class(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    # idle tabs polling an unchanged list get an empty 304
+    return response.make_conditional(request)
+
+# asgi.py turns it on for the native stream unless SLOT_STREAM is "off"
+app.config["SLOT_STREAM"] = SLOT_STREAM == "on"
+
+@app.route("/slots/stream")
+def slots_stream():
+    # a 503 closes the EventSource for good; the page polls /slots
+    if not app.config["SLOT_STREAM"]:
+        return "Live updates are off", 503
+    try:
+        q = slot_events.subscribe()
+    except StreamsFull:
+        return "Too many live connections", 503
+
+    response = app.response_class(
+        stream_events(q),
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",   # don't let nginx buffer events
+        }
+    )
+    # the generator's own cleanup never runs if it is never started
+    response.call_on_close(lambda: slot_events.unsubscribe(q))
+    return response
 
 @app.route("/book", methods=["POST"])
 def book():
     f = request.form
-    conn = db()
-
-    slot = conn.execute("""
-        SELECT * FROM slots
-        WHERE id=? AND is_booked=0
-    """, (f["slot_id"],)).fetchone()
-
-    if not slot or slot["slot_date"] < date.today().isoformat():
-        flash("Slot not available", "patient-error")
-        return redirect("/patient")
 
     # ✅ FIXED LINE
     consultation_type = f.get("consultation_type", "FIRST")
 
-    settings = conn.execute("""
-        SELECT default_amount, followup_amount
-        FROM admin_settings WHERE id=1
-    """).fetchone()
-
-    amount = (
-        settings["followup_amount"]
-        if consultation_type == "FOLLOWUP"
-        else settings["default_amount"]
-    )
-
-    code = generate_code()
-    now = datetime.now().isoformat()
-
-    conn.execute("""
-        INSERT INTO appointments (
-            confirmation_code,
-            patient_name, mobile, address,
-            slot_id, appointment_date, slot_time,
-            consultation_type, amount,
-            status, created_at, updated_at
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 'RESERVED', ?, ?)
-    """, (
-        code,
-        f["patient_name"],
-        f["mobile"],
-        f["address"],
-        slot["id"],
-        slot["slot_date"],
-        f'{slot["start_time"]}-{slot["end_time"]}',
-        consultation_type,
-        amount,
-        now,
-        now
-    ))
+    conn = db()
+    try:
+        # the reservation message commits with the booking, or neither does
+        reserve_slot(
+            conn,
+            f["slot_id"],
+            f["patient_name"],
+            f["mobile"],
+            f["address"],
+            consultation_type,
+            on_reserved=lambda c, a: queue_patient_message(c, "reservation", a)
+        )
+    except SlotUnavailable:
+        flash("Slot not available", "patient-error")
+        return redirect("/patient")
 
-    conn.execute("UPDATE slots SET is_booked=1 WHERE id=?", (slot["id"],))
-    conn.commit()
-    conn.close()
+    slots_claimed(conn, f["slot_id"])
+    outbox_worker.wake()
 
     flash("Appointment reserved. Payment details will be sent via WhatsApp.", "patient-info")
     return redirect("/patient")
@@ -256,10 +454,9 @@ def status():
     if request.method == "POST":
         conn = db()
         appt = conn.execute(
-            "SELECT * FROM appointments WHERE confirmation_code=?",
+            "SELECT * FROM appointments_all WHERE confirmation_code=?",
             (request.form["confirmation_code"],)
         ).fetchone()
-        conn.close()
     return render_template("status.html", appointment=appt)
 
 @app.route("/history", methods=["GET", "POST"])
@@ -268,10 +465,9 @@ def history():
     if request.method == "POST":
         conn = db()
         rows = conn.execute(
-            "SELECT * FROM appointments WHERE mobile=? ORDER BY created_at DESC",
+            "SELECT * FROM appointments_all WHERE mobile=? ORDER BY created_at DESC",
             (request.form["mobile"],)
         ).fetchall()
-        conn.close()
     return render_template("history.html", appointments=rows)
 
 @app.route("/cancel/<code>", methods=["POST"])
@@ -285,7 +481,6 @@ def cancel(code):
     """, (code,)).fetchone()
 
     if not appt or appt["status"] != "RESERVED":
-        conn.close()
         flash("Appointment cannot be cancelled", "patient-error")
         return redirect("/status")
 
@@ -309,22 +504,14 @@ def cancel(code):
         conn.rollback()
         print("Cancel error:", e)
         flash("Cancellation failed", "patient-error")
-        conn.close()
         return redirect("/status")
 
-    conn.close()
+    slots_freed(conn, appt["slot_id"])
 
-    # 📲 WhatsApp message to doctor
-    doctor_number = db().execute(
-        "SELECT doctor_whatsapp FROM admin_settings WHERE id=1"
-    ).fetchone()["doctor_whatsapp"]
+    # 📲 WhatsApp message to doctor (same request connection)
+    doctor_number = settings_cache.get(conn).doctor_whatsapp
 
-    msg = doctor_cancel_message(appt)
-
-    wa_link = (
-        f"https://wa.me/{doctor_number}"
-        f"?text={msg.replace(' ', '%20').replace('\\n', '%0A')}"
-    )
+    wa_link = cancel_link(doctor_number, appt)
 
     return render_template(
         "cancel_success.html",
@@ -337,110 +524,71 @@ def cancel(code):
 # =================================================
 @app.route("/appointment/pdf/<code>")
 def appointment_pdf(code):
-    conn = db()
-    a = conn.execute("""
-        SELECT a.*, s.doctor_whatsapp
-        FROM appointments a
-        JOIN admin_settings s ON s.id = 1
-        WHERE a.confirmation_code = ?
-    """, (code,)).fetchone()
-    conn.close()
+    # not db(): the connection would stay checked out while the render
+    # waits up to PDF_TIMEOUT, and a burst of downloads would drain the pool
+    with pool.connection() as conn:
+        a = conn.execute(
+            "SELECT * FROM appointments_all WHERE confirmation_code = ?", (code,)
+        ).fetchone()
+        if a:
+            a = dict(a, doctor_whatsapp=settings_cache.get(conn).doctor_whatsapp)
 
     if not a:
         return "Invalid confirmation code", 404
 
-    buf = io.BytesIO()
-    pdf = canvas.Canvas(buf, pagesize=A4)
-    width, height = A4
-
-    y = height - 50
-
-    # ================= HEADER =================
-    pdf.setFont("Helvetica-Bold", 18)
-    pdf.drawCentredString(width / 2, y, "Harmony HomeoCare")
-    y -= 25
-
-    pdf.setFont("Helvetica", 11)
-    pdf.drawCentredString(
-        width / 2, y,
-        "Online Homeopathy Consultation"
-    )
-    y -= 15
-
-    pdf.setFont("Helvetica", 10)
-    pdf.drawCentredString(
-        width / 2, y,
-        f"WhatsApp: +{a['doctor_whatsapp']}"
-    )
-
-    # Divider
-    y -= 25
-    pdf.line(40, y, width - 40, y)
-    y -= 30
-
-    # ================= TITLE =================
-    pdf.setFont("Helvetica-Bold", 14)
-    pdf.drawCentredString(width / 2, y, "CONSULTATION RECEIPT")
-    y -= 30
-
-    # ================= DETAILS =================
-    pdf.setFont("Helvetica", 11)
-
-    def row(label, value):
-        nonlocal y
-        pdf.drawString(60, y, f"{label}:")
-        pdf.drawString(220, y, str(value))
-        y -= 22
-
-    row("Receipt No", a["confirmation_code"])
-    row("Patient Name", a["patient_name"])
-    row("Mobile Number", a["mobile"])
-    row("Appointment Date", a["appointment_date"])
-    row("Time Slot", a["slot_time"])
-    row("Consultation Type", (a["consultation_type"] or "FIRST").title())
-    row("Status", a["status"])
-    row("Amount Paid", f"₹ {a['amount']}")
-
-    # ================= NOTES =================
-    y -= 10
-    pdf.line(60, y, width - 60, y)
-    y -= 25
-
-    pdf.setFont("Helvetica-Oblique", 10)
-    pdf.drawString(
-        60, y,
-        "Note: This is a computer-generated receipt and does not require a signature."
-    )
-
-    # ================= FINALIZE =================
-    pdf.showPage()
-    pdf.save()
-    buf.seek(0)
+    try:
+        data = receipt_cache.get(a)
+    except RenderBusy as e:
+        # every PDF worker is busy: shed load instead of queueing
+        response = app.response_class(
+            "Receipts are busy right now, please retry shortly.",
+            status=503, mimetype="text/plain"
+        )
+        response.headers["Retry-After"] = str(e.retry_after)
+        return response
 
     return send_file(
-        buf,
+        io.BytesIO(data),
         as_attachment=True,
         download_name=f"{a['confirmation_code']}.pdf",
         mimetype="application/pdf"
     )
 
-    # ================= FOOTER =================
-    y -= 40
-    pdf.setFont("Helvetica", 9)
-    pdf.drawCentredString(
-        width / 2, y,
-        "Thank you for choosing SangamKripa HomeoCare"
-    )
+@app.route("/admin/receipts/export")
+def admin_export_receipts():
+    if not session.get("admin"):
+        return redirect("/admin")
 
-    pdf.showPage()
-    pdf.save()
-    buf.seek(0)
+    fmt = "pdf" if request.args.get("format") == "pdf" else "zip"
+
+    # the dashboard's Export link passes its filters on unchanged;
+    # the connection goes back to the pool before rendering starts
+    with pool.connection() as conn:
+        clause, params = appointment_filters(conn, request.args)
+        query = "SELECT * FROM appointments WHERE 1=1" + clause
+
+        codes = [c for c in request.args.get("codes", "").split(",") if c]
+        if codes:
+            query += f" AND confirmation_code IN ({','.join('?' * len(codes))})"
+            params.extend(codes)
+
+        query += " ORDER BY appointment_date, id LIMIT ?"
+        params.append(EXPORT_LIMIT)
+
+        doctor_whatsapp = settings_cache.get(conn).doctor_whatsapp
+        rows = [
+            dict(r, doctor_whatsapp=doctor_whatsapp)
+            for r in conn.execute(query, params).fetchall()
+        ]
+    if not rows:
+        flash("No appointments to export", "admin-error")
+        return redirect("/admin/dashboard")
 
     return send_file(
-        buf,
+        io.BytesIO(export_receipts(rows, fmt)),
         as_attachment=True,
-        download_name=f"{code}_receipt.pdf",
-        mimetype="application/pdf"
+        download_name=f"receipts-{date.today().isoformat()}.{fmt}",
+        mimetype="application/pdf" if fmt == "pdf" else "application/zip"
     )
 
 
@@ -454,62 +602,28 @@ def admin_dashboard():
 
     search = request.args.get("search", "")
     status_filter = request.args.get("status", "")
-    consult_filter = request.args.get("consultation_type", "")
     from_date = request.args.get("from_date", "")
     to_date = request.args.get("to_date", "")
 
     conn = db()
-    query = "SELECT * FROM appointments WHERE 1=1"
-    params = []
-
-    if search:
-        like = f"%{search}%"
-        query += " AND (patient_name LIKE ? OR mobile LIKE ? OR confirmation_code LIKE ?)"
-        params.extend([like, like, like])
-
-    if status_filter:
-        query += " AND status=?"
-        params.append(status_filter)
-
-    if consult_filter:
-        query += " AND consultation_type=?"
-        params.append(consult_filter)
-
-    if from_date:
-        query += " AND appointment_date >= ?"
-        params.append(from_date)
-
-    if to_date:
-        query += " AND appointment_date <= ?"
-        params.append(to_date)
-
-    query += " ORDER BY appointment_date DESC"
-
-    appointments = conn.execute(query, params).fetchall()
-
-    stats = {
-        "total": conn.execute("SELECT COUNT(*) FROM appointments").fetchone()[0],
-        "reserved": conn.execute("SELECT COUNT(*) FROM appointments WHERE status='RESERVED'").fetchone()[0],
-        "confirmed": conn.execute("SELECT COUNT(*) FROM appointments WHERE status='CONFIRMED'").fetchone()[0],
-        "today": conn.execute(
-            "SELECT COUNT(*) FROM appointments WHERE appointment_date=DATE('now')"
-        ).fetchone()[0],
-    }
-
-    slots = conn.execute(
-        "SELECT * FROM slots ORDER BY slot_date,start_time"
-    ).fetchall()
+    appointments, next_appointments = appointment_page(conn, request.args)
+    try:
+        slots, next_slots = slot_page(conn, request.args)
+    except CursorError as e:
+        return str(e), 400
+    slot_rules = active_rules(conn)
 
-    settings = conn.execute(
-        "SELECT * FROM admin_settings WHERE id=1"
-    ).fetchone()
+    stats = dashboard_stats(conn)
 
-    conn.close()
+    settings = settings_cache.get(conn)
 
     return render_template(
         "admin_dashboard.html",
         appointments=appointments,
+        next_appointments=next_appointments,
         slots=slots,
+        next_slots=next_slots,
+        slot_rules=slot_rules,
         settings=settings,
         stats=stats,
         search=search,
@@ -518,6 +632,77 @@ def admin_dashboard():
         to_date=to_date
     )
 
+@app.route("/admin/appointments/page")
+def admin_appointments_page():
+    if not session.get("admin"):
+        return jsonify({"error": "unauthorized"}), 401
+
+    conn = db()
+    appointments, next_cursor = appointment_page(conn, request.args)
+    settings = settings_cache.get(conn)
+
+    return jsonify({
+        "html": render_template(
+            "_appointment_cards.html",
+            appointments=appointments,
+            settings=settings
+        ),
+        "next": next_cursor
+    })
+
+@app.route("/admin/slots/page")
+def admin_slots_page():
+    if not session.get("admin"):
+        return jsonify({"error": "unauthorized"}), 401
+
+    try:
+        slots, next_cursor = slot_page(db(), request.args)
+    except CursorError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({
+        "html": render_template("_slot_chips.html", slots=slots),
+        "next": next_cursor
+    })
+
+@app.route("/admin/stats")
+def admin_stats():
+    if not session.get("admin"):
+        return jsonify({"error": "unauthorized"}), 401
+
+    today = date.today()
+    from_date = request.args.get("from_date") or (today - timedelta(days=30)).isoformat()
+    to_date = request.args.get("to_date") or (today + timedelta(days=30)).isoformat()
+
+    conn = db()
+    return jsonify({
+        "counters": dashboard_stats(conn),
+        "daily": daily_breakdown(conn, from_date, to_date)
+    })
+
+@app.route("/admin/search")
+def admin_search():
+    if not session.get("admin"):
+        return jsonify({"error": "unauthorized"}), 401
+
+    q = request.args.get("q", "")
+    if not q.strip():
+        return jsonify([])
+
+    rows = search_appointments(db(), q, limit=page_size(request.args))
+    return jsonify([
+        {
+            "id": r["id"],
+            "confirmation_code": r["confirmation_code"],
+            "patient_name": r["patient_name"],
+            "mobile": r["mobile"],
+            "appointment_date": r["appointment_date"],
+            "slot_time": r["slot_time"],
+            "status": r["status"],
+        }
+        for r in rows
+    ])
+
 @app.route("/admin/update/<int:id>", methods=["POST"])
 def admin_update(id):
     if not session.get("admin"):
@@ -530,27 +715,24 @@ def admin_update(id):
 
     # Fetch existing appointment
     appt = conn.execute(
-        "SELECT consultation_type FROM appointments WHERE id=?",
+        "SELECT confirmation_code, consultation_type, starts_at FROM appointments WHERE id=?",
         (id,)
     ).fetchone()
 
     if not appt:
-        conn.close()
         flash("Appointment not found", "admin-error")
         return redirect("/admin/dashboard")
 
     # Get fee based on consultation type
-    settings = conn.execute(
-        "SELECT default_amount, followup_amount FROM admin_settings WHERE id=1"
-    ).fetchone()
+    settings = settings_cache.get(conn)
 
     amount = (
-        settings["followup_amount"]
+        settings.followup_amount
         if appt["consultation_type"] == "followup"
-        else settings["default_amount"]
+        else settings.default_amount
     )
 
-    conn.execute("""
+    updated = conn.execute("""
         UPDATE appointments
         SET status = ?,
             meeting_link = ?,
@@ -558,6 +740,7 @@ def admin_update(id):
             amount = ?,
             updated_at = ?
         WHERE id = ?
+        RETURNING *
     """, (
         f.get("status"),
         f.get("meeting_link"),
@@ -565,32 +748,54 @@ def admin_update(id):
         amount,
         now,
         id
-    ))
+    )).fetchone()
+
+    if f.get("status") == "CONFIRMED":
+        queue_patient_message(conn, "confirmation", updated)
 
     conn.commit()
-    conn.close()
+    receipt_cache.invalidate(appt["confirmation_code"])
+
+    if f.get("status") == "CONFIRMED":
+        outbox_worker.wake()
+        if appt["starts_at"]:
+            job_runner.schedule_reminder(appt["starts_at"])
 
     flash("Appointment updated successfully", "admin-info")
     return redirect("/admin/dashboard")
 
 
 # -------- DELETE SLOT --------
-@app.route("/admin/delete/slot/<int:id>", methods=["POST"])
-def delete_slot(id):
+@app.route("/admin/delete/slot/<slot_id>", methods=["POST"])
+def delete_slot(slot_id):
     if not session.get("admin"):
         return redirect("/admin")
 
     conn = db()
+
+    if not slot_id.isdigit():
+        # a generated slot ('2026-02-07T10:15'): record the removal
+        day, sep, start = slot_id.partition("T")
+        if sep:
+            remove_slot(conn, day, start)
+            conn.commit()
+            slots_claimed(conn, slot_id)
+        return redirect("/admin/dashboard")
+
     slot = conn.execute(
-        "SELECT is_booked FROM slots WHERE id=?",
-        (id,)
+        "SELECT is_booked, slot_date, start_time FROM slots WHERE id=?",
+        (slot_id,)
     ).fetchone()
 
     if slot and not slot["is_booked"]:
-        conn.execute("DELETE FROM slots WHERE id=?", (id,))
+        conn.execute("DELETE FROM slots WHERE id=?", (slot_id,))
+        # a freed booking of a rule slot must not come back as generated
+        key = slot_key(slot["slot_date"], slot["start_time"])
+        if any(s["id"] == key for s in slots_between(conn, slot["slot_date"], slot["slot_date"])):
+            remove_slot(conn, slot["slot_date"], slot["start_time"])
         conn.commit()
+        slots_claimed(conn, slot_id)
 
-    conn.close()
     return redirect("/admin/dashboard")
 
 # -------- DELETE APPOINTMENT --------
@@ -619,8 +824,8 @@ def delete_appointment(id):
         )
 
         conn.commit()
+        slots_freed(conn, appt["slot_id"])
 
-    conn.close()
     flash("Appointment deleted and slot freed", "admin-info")
     return redirect("/admin/dashboard")
 
@@ -635,22 +840,12 @@ def admin_settings():
     f = request.form
     conn = db()
 
-    conn.execute("""
-        UPDATE admin_settings
-        SET doctor_whatsapp=?,
-            upi_link=?,
-            default_amount=?,
-            followup_amount=?
-        WHERE id=1
-    """, (
-        f.get("doctor_whatsapp"),
-        f.get("upi_link"),
-        f.get("default_amount"),
-        f.get("followup_amount"),
-    ))
-
+    update_settings(conn, f)
     conn.commit()
-    conn.close()
+    settings_cache.invalidate()
+    # doctor number / fees are printed on every receipt
+    receipt_cache.clear()
+    clear_compiled()
     flash("Settings updated successfully", "admin-info")
     return redirect("/admin/dashboard")
 
@@ -664,6 +859,12 @@ def admin_login():
         flash("Invalid credentials", "admin-error")
     return render_template("admin_login.html")
 
+@app.route("/admin/db-stats")
+def admin_db_stats():
+    if not session.get("admin"):
+        return redirect("/admin")
+    return jsonify({**pool.stats(), "outbox": outbox_stats(db())})
+
 @app.route("/admin/logout")
 def admin_logout():
     session.clear()
@@ -681,20 +882,73 @@ def add_slot():
         return redirect("/admin/dashboard")
 
     conn = db()
-    conn.execute("""
+    slot_id = conn.execute("""
         INSERT INTO slots (slot_date, start_time, end_time, is_booked)
         VALUES (?, ?, ?, 0)
     """, (
         f["slot_date"],
         f["start_time"],
         f["end_time"]
-    ))
+    )).lastrowid
     conn.commit()
-    conn.close()
+    slots_freed(conn, slot_id)
 
     flash("Slot added successfully", "admin-info")
     return redirect("/admin/dashboard")
 
+# -------- RECURRING SCHEDULE --------
+def schedule_input():
+    return request.get_json(silent=True) or request.form
+
+@app.route("/admin/slots/schedule/preview", methods=["POST"])
+def preview_slot_schedule():
+    if not session.get("admin"):
+        return jsonify({"error": "login required"}), 401
+
+    try:
+        schedule = parse_schedule(schedule_input())
+        return jsonify(preview_schedule(db(), schedule))
+    except ScheduleError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route("/admin/slots/schedule", methods=["POST"])
+def save_slot_schedule():
+    if not session.get("admin"):
+        return redirect("/admin")
+
+    conn = db()
+    try:
+        schedule = parse_schedule(schedule_input())
+        offered, overlaps = split_overlaps(conn, expand(schedule))
+    except ScheduleError as e:
+        flash(f"Schedule not saved: {e}", "admin-error")
+        return redirect("/admin/dashboard")
+
+    # one rule row; the slots themselves are computed on read
+    save_rule(conn, schedule)
+    conn.commit()
+    slots_changed()
+
+    message = f"Schedule saved: {len(offered)} slot(s) offered"
+    if overlaps:
+        message += f", {len(overlaps)} skipped (overlap with existing slots)"
+    flash(message, "admin-info")
+    return redirect("/admin/dashboard")
+
+@app.route("/admin/slots/rules/<int:id>/delete", methods=["POST"])
+def delete_slot_rule(id):
+    if not session.get("admin"):
+        return redirect("/admin")
+
+    # booked slots are rows of their own and stay
+    conn = db()
+    conn.execute("DELETE FROM slot_rules WHERE id=?", (id,))
+    conn.commit()
+    slots_changed()
+
+    flash("Schedule removed", "admin-info")
+    return redirect("/admin/dashboard")
+
 # =================================================
 if __name__ == "__main__":
-    app.run(debug=True, host="0.0.0.0")
+    create_app().run(debug=True, host="0.0.0.0")
@@ -0,0 +1,156 @@
+"""
+Cold storage for past appointments.
+
+Appointments dated more than MEDBUDDY_ARCHIVE_AFTER_DAYS ago move,
+with their medical_reports rows, into appointments_archive /
+medical_reports_archive; past slots move into slots_archive (booked)
+or are dropped (never booked). The hot tables and their indexes stay
+the size of the upcoming schedule, while /status, /history, receipts
+and report downloads read the appointments_all / medical_reports_all
+views and still find everything.
+
+    python archive.py        # one run now; the scheduler runs it nightly
+
+Each batch is one short IMMEDIATE transaction, so bookings are only
+held up for a batch at a time. The archive tables live in the same
+database file: a move is then a single atomic commit, which an
+ATTACHed file cannot promise in WAL mode.
+"""
+import os
+from datetime import date, datetime, timedelta
+
+from database import pool, immediate
+from init_db import columns
+from metrics import timed_job
+
+ARCHIVE_AFTER_DAYS = int(os.environ.get("MEDBUDDY_ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_BATCH = 500
+
+
+def _marks(values):
+    return ",".join("?" * len(values))
+
+
+def _move(conn, table, where, params, now):
+    """Copy matching rows into <table>_archive. Returns the count."""
+    cols = ", ".join(columns(conn.cursor(), table))
+    return conn.execute(f"""
+        INSERT OR IGNORE INTO {table}_archive ({cols}, archived_at)
+        SELECT {cols}, ? FROM {table} WHERE {where}
+    """, (now, *params)).rowcount
+
+
+def archive_appointments(conn, cutoff, batch_size=ARCHIVE_BATCH):
+    """Move appointments dated before `cutoff`, and their reports."""
+    result = {"appointments": 0, "reports": 0, "batches": 0}
+
+    def batch(conn):
+        rows = conn.execute("""
+            SELECT id, confirmation_code FROM appointments
+            WHERE appointment_date < ?
+            ORDER BY appointment_date
+            LIMIT ?
+        """, (cutoff, batch_size)).fetchall()
+        if not rows:
+            return 0
+
+        now = datetime.now().isoformat()
+        ids = [r["id"] for r in rows]
+        codes = [r["confirmation_code"] for r in rows]
+
+        # the archive copy must exist before the delete: the stats
+        # trigger skips rows already in appointments_archive
+        _move(conn, "appointments", f"id IN ({_marks(ids)})", ids, now)
+        result["reports"] += _move(
+            conn, "medical_reports", f"confirmation_code IN ({_marks(codes)})", codes, now
+        )
+        conn.execute(
+            f"DELETE FROM medical_reports WHERE confirmation_code IN ({_marks(codes)})", codes
+        )
+        conn.execute(f"DELETE FROM appointments WHERE id IN ({_marks(ids)})", ids)
+        return len(rows)
+
+    while True:
+        moved = immediate(conn, batch)
+        result["appointments"] += moved
+        result["batches"] += 1
+        if moved < batch_size:
+            return result
+
+
+def archive_slots(conn, cutoff, batch_size=ARCHIVE_BATCH):
+    """
+    Move booked slots dated before `cutoff` and drop the open ones,
+    along with the slot_exceptions for those days.
+    """
+    result = {"slots": 0, "dropped": 0, "batches": 0}
+
+    def batch(conn):
+        ids = [r["id"] for r in conn.execute("""
+            SELECT id FROM slots WHERE slot_date < ? LIMIT ?
+        """, (cutoff, batch_size))]
+        if not ids:
+            return 0
+
+        moved = _move(
+            conn, "slots", f"id IN ({_marks(ids)}) AND is_booked = 1", ids,
+            datetime.now().isoformat()
+        )
+        conn.execute(f"DELETE FROM slots WHERE id IN ({_marks(ids)})", ids)
+        result["slots"] += moved
+        result["dropped"] += len(ids) - moved
+        return len(ids)
+
+    while True:
+        done = immediate(conn, batch)
+        result["batches"] += 1
+        if done < batch_size:
+            break
+
+    immediate(conn, lambda c: c.execute(
+        "DELETE FROM slot_exceptions WHERE slot_date < ?", (cutoff,)
+    ))
+    return result
+
+
+def reclaim_space(conn):
+    """
+    Hand the pages freed by the deletes back to the filesystem.
+    The first run switches the file to incremental auto_vacuum,
+    which takes one full VACUUM; later runs only truncate the
+    free pages.
+    """
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        conn.execute("PRAGMA incremental_vacuum").fetchall()
+    else:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+    return {
+        "free_pages": free,
+        "reclaimed": free - conn.execute("PRAGMA freelist_count").fetchone()[0],
+    }
+
+
+@timed_job
+def archive_history(after_days=ARCHIVE_AFTER_DAYS, today=None):
+    """Archive everything older than `after_days`. Returns counts."""
+    cutoff = ((today or date.today()) - timedelta(days=after_days)).isoformat()
+
+    with pool.connection() as conn:
+        result = archive_appointments(conn, cutoff)
+        slots = archive_slots(conn, cutoff)
+        result["slots"] = slots["slots"]
+        result["slots_dropped"] = slots["dropped"]
+        result["batches"] += slots["batches"]
+        if result["appointments"] or result["slots"] or result["slots_dropped"]:
+            result.update(reclaim_space(conn))
+
+    if result["appointments"] or result["slots"]:
+        print(f"🗄 Archived {result['appointments']} appointment(s), "
+              f"{result['slots']} slot(s) before {cutoff}")
+    return result
+
+
+if __name__ == "__main__":
+    print(archive_history())
@@ -0,0 +1,223 @@
+"""
+ASGI serving mode.
+
+    uvicorn asgi:application --workers 4
+
+/slots/stream is served natively on the event loop: a subscriber
+costs no thread, so one process can hold thousands of them
+(MEDBUDDY_STREAM_MAX; past that it answers 503 and pages poll).
+
+Everything else runs the Flask views unchanged through a2wsgi's
+WSGIMiddleware, on a pool of MEDBUDDY_ASGI_THREADS threads. The
+default is the SQLite pool size: a request holds its thread from
+reading the body to sending the last chunk, and more threads than
+connections would only queue on the pool.
+"""
+import asyncio
+import os
+import queue
+import threading
+from collections import deque
+
+from a2wsgi import WSGIMiddleware
+
+from app import app, start_background
+from availability import (
+    slot_cache, slot_events, StreamsFull, SLOT_STREAM, STREAM_HEARTBEAT,
+    sse_message, stream_lifetime
+)
+from database import POOL_SIZE
+from metrics import register_collector
+
+ASGI_THREADS = int(os.environ.get("MEDBUDDY_ASGI_THREADS", str(POOL_SIZE)))
+
+STREAM_HEADERS = [
+    (b"content-type", b"text/event-stream; charset=utf-8"),
+    (b"cache-control", b"no-cache"),
+    (b"x-accel-buffering", b"no"),
+]
+
+
+def fold_cookies(scope):
+    """
+    One Cookie header for a2wsgi, which joins repeated headers with
+    "," where Cookie needs "; " (RFC 6265).
+    """
+    cookies = [v for k, v in scope["headers"] if k == b"cookie"]
+    if len(cookies) < 2:
+        return scope
+    headers = [(k, v) for k, v in scope["headers"] if k != b"cookie"]
+    return {**scope, "headers": [*headers, (b"cookie", b"; ".join(cookies))]}
+
+
+async def respond(send, status, headers, body=b""):
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+# =================================================
+# /slots/stream
+# =================================================
+class LoopSubscriber:
+    """
+    A SlotEvents subscriber for the event loop. publish() runs on
+    request / job threads, so items go through a locked deque and
+    the waiting coroutine is woken with call_soon_threadsafe.
+    """
+
+    def __init__(self, loop, maxsize):
+        self.maxsize = maxsize
+        self._loop = loop
+        self._items = deque()
+        self._lock = threading.Lock()
+        self._ready = asyncio.Event()
+
+    # ---- queue.Queue face, for SlotEvents.publish ----
+    def put_nowait(self, item):
+        with self._lock:
+            if len(self._items) >= self.maxsize:
+                raise queue.Full
+            self._items.append(item)
+        self._loop.call_soon_threadsafe(self._ready.set)
+
+    def get_nowait(self):
+        with self._lock:
+            if not self._items:
+                raise queue.Empty
+            return self._items.popleft()
+
+    def empty(self):
+        with self._lock:
+            return not self._items
+
+    # ---- loop side ----
+    async def get(self, timeout):
+        deadline = self._loop.time() + timeout
+        while True:
+            with self._lock:
+                if self._items:
+                    return self._items.popleft()
+                self._ready.clear()
+            remaining = deadline - self._loop.time()
+            if remaining <= 0:
+                raise queue.Empty
+            try:
+                await asyncio.wait_for(self._ready.wait(), remaining)
+            except asyncio.TimeoutError:
+                raise queue.Empty
+
+
+async def wait_disconnect(receive, q):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+    try:
+        q.put_nowait(("disconnect", None, None))    # wake the stream now
+    except queue.Full:
+        pass
+
+
+async def slot_stream(run, receive, send, heartbeat=STREAM_HEARTBEAT):
+    """availability.stream_events, without holding a thread."""
+    loop = asyncio.get_running_loop()
+    q = LoopSubscriber(loop, slot_events.backlog)
+    try:
+        slot_events.subscribe(q)
+    except StreamsFull:
+        await respond(send, 503, [(b"content-type", b"text/plain")],
+                      b"Too many live connections")
+        return
+
+    ends = loop.time() + stream_lifetime()
+    disconnected = asyncio.ensure_future(wait_disconnect(receive, q))
+    try:
+        await send({"type": "http.response.start", "status": 200, "headers": STREAM_HEADERS})
+        etag = None
+        while not disconnected.done() and loop.time() < ends:
+            # a hit is a dict lookup; a miss reads the database
+            body, current = await run(slot_cache.get)
+            if current != etag:
+                etag = current
+                chunk = sse_message("snapshot", body)
+            else:
+                chunk = ": ping\n\n"
+            await send({"type": "http.response.body", "body": chunk.encode(), "more_body": True})
+
+            deadline = min(loop.time() + heartbeat, ends)
+            while not disconnected.done():
+                remaining = deadline - loop.time()
+                try:
+                    event, data, applied = await q.get(remaining)
+                except queue.Empty:
+                    break
+                if event == "disconnect":
+                    break
+                if event == "resync":
+                    etag = None
+                    break
+                await send({"type": "http.response.body",
+                            "body": sse_message(event, data).encode(), "more_body": True})
+                if applied:
+                    etag = applied
+        await send({"type": "http.response.body", "body": b""})
+    except OSError:
+        pass    # client went away mid-send
+    finally:
+        slot_events.unsubscribe(q)
+        disconnected.cancel()
+
+
+# =================================================
+# APPLICATION
+# =================================================
+class Application:
+    def __init__(self, wsgi_app, threads=ASGI_THREADS):
+        self.threads = threads
+        self.wsgi = WSGIMiddleware(wsgi_app, workers=threads)
+        self.pending = 0        # WSGI requests in flight
+
+    async def run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.wsgi.executor, fn, *args)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        if (scope["path"] == "/slots/stream" and scope["method"] == "GET"
+                and app.config["SLOT_STREAM"]):
+            await slot_stream(self.run, receive, send)
+            return
+
+        self.pending += 1
+        try:
+            await self.wsgi(fold_cookies(scope), receive, send)
+        finally:
+            self.pending -= 1
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                # migrate, warm the render workers, start the jobs
+                start_background()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.wsgi.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def stats(self):
+        return {
+            "threads": self.threads,
+            "pending": self.pending,
+            "streams": slot_events.count(),
+        }
+
+
+# subscribers here hold no thread: the stream is on unless turned off
+app.config["SLOT_STREAM"] = SLOT_STREAM != "off"
+
+application = Application(app)
+register_collector("asgi", application.stats, "ASGI thread pool and open streams.")
@@ -0,0 +1,273 @@
+import hashlib
+import json
+import os
+import queue
+import random
+import threading
+import time
+from datetime import date
+
+from database import pool
+from schedules import slots_between
+
+# Writes in this process invalidate immediately; the TTL only bounds
+# staleness from writes made by other worker processes.
+SLOT_CACHE_TTL = float(os.environ.get("MEDBUDDY_SLOT_CACHE_TTL", "10"))
+
+STREAM_HEARTBEAT = 15      # seconds between keep-alive / resync checks
+STREAM_BACKLOG = 100       # undelivered events before a client is resynced
+
+# "asgi": /slots/stream only under asgi.py, where a subscriber costs
+# no thread; "on": under WSGI servers too (a thread per subscriber);
+# "off": patients poll /slots.
+SLOT_STREAM = os.environ.get("MEDBUDDY_SLOT_STREAM", "asgi")
+# streams end after this long (+/- jitter) and EventSource reconnects,
+# so clients rebalance across workers and pick up a fresh snapshot
+STREAM_LIFETIME = float(os.environ.get("MEDBUDDY_STREAM_LIFETIME", "600"))
+# per process; past this /slots/stream answers 503 and pages poll
+STREAM_MAX_SUBSCRIBERS = int(os.environ.get("MEDBUDDY_STREAM_MAX", "500"))
+
+
+def open_slots(conn, today):
+    """
+    Future, unbooked slots (stored and rule-generated) with only
+    the fields the patient page uses.
+    """
+    return [
+        {k: s[k] for k in ("id", "slot_date", "start_time", "end_time")}
+        for s in slots_between(conn, today)
+    ]
+
+
+class SlotCache:
+    """
+    Serialized /slots payload plus its strong ETag, rebuilt on the
+    first request after a slot-changing write (or the day rolling over).
+    """
+
+    def __init__(self, ttl=SLOT_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._rebuild = threading.Lock()
+        self._entry = None      # (day, expires, body, etag)
+        self._version = 0
+        self.hits = 0
+        self.misses = 0
+
+    def invalidate(self):
+        with self._lock:
+            self._version += 1
+            self._entry = None
+
+    def get(self, conn=None):
+        """
+        Return (body, etag). On a miss `conn` is read, or one is
+        borrowed from the pool.
+        """
+        today = date.today().isoformat()
+
+        entry = self._fresh(today)
+        if entry:
+            return entry
+
+        # one rebuild at a time: after a write, every open stream asks
+        # at once and would otherwise each borrow a connection
+        with self._rebuild:
+            entry = self._fresh(today)
+            if entry:
+                return entry
+
+            with self._lock:
+                self.misses += 1
+                version = self._version
+
+            if conn is None:
+                with pool.connection() as conn:
+                    rows = open_slots(conn, today)
+            else:
+                rows = open_slots(conn, today)
+
+            body = json.dumps(rows, separators=(",", ":")).encode()
+            etag = hashlib.sha1(body).hexdigest()
+
+            with self._lock:
+                # a write landed while we were reading: don't cache stale data
+                if self._version == version:
+                    self._entry = (today, time.monotonic() + self.ttl, body, etag)
+
+        return body, etag
+
+    def _fresh(self, today):
+        with self._lock:
+            entry = self._entry
+            if entry and entry[0] == today and entry[1] > time.monotonic():
+                self.hits += 1
+                return entry[2], entry[3]
+        return None
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+slot_cache = SlotCache()
+
+
+class StreamsFull(Exception):
+    pass
+
+
+class SlotEvents:
+    """
+    In-process fan-out of slot deltas to /slots/stream subscribers.
+    A subscriber that falls behind is sent a full snapshot instead.
+    Events are (event, data, etag): etag is the /slots ETag with the
+    delta applied, so a stream doesn't resend it as a snapshot.
+    """
+
+    def __init__(self, backlog=STREAM_BACKLOG, limit=STREAM_MAX_SUBSCRIBERS):
+        self.backlog = backlog
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._subscribers = set()
+
+    def subscribe(self, q=None):
+        """
+        Register a subscriber queue (a bounded queue.Queue unless one
+        with the same put_nowait / get_nowait / empty face is given).
+        Raises StreamsFull past `limit` subscribers.
+        """
+        q = q or queue.Queue(maxsize=self.backlog)
+        with self._lock:
+            if len(self._subscribers) >= self.limit:
+                raise StreamsFull()
+            self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def publish(self, event, data, etag=None):
+        with self._lock:
+            subscribers = list(self._subscribers)
+
+        for q in subscribers:
+            try:
+                q.put_nowait((event, data, etag))
+            except queue.Full:
+                # drop the backlog; the stream sends a snapshot instead
+                while not q.empty():
+                    try:
+                        q.get_nowait()
+                    except queue.Empty:
+                        break
+                q.put_nowait(("resync", None, None))
+
+    def count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+
+slot_events = SlotEvents()
+
+
+# ---------------- WRITE HOOKS ----------------
+def _slot_id(value):
+    # stored slots have integer ids, generated ones '2026-02-07T10:15'
+    return int(value) if str(value).isdigit() else value
+
+
+def _rebuilt_etag(conn):
+    # rebuilt right after the commit, so only a write from another
+    # process landing in these few milliseconds is folded in unseen
+    return slot_cache.get(conn)[1]
+
+
+def slots_claimed(conn, *slot_ids):
+    """Call after committing a write that took slots off the market."""
+    slot_cache.invalidate()
+    if not slot_events.count() or not slot_ids:
+        return
+
+    slot_events.publish(
+        "slot-claimed", [{"id": _slot_id(i)} for i in slot_ids], _rebuilt_etag(conn)
+    )
+
+
+def slots_freed(conn, *slot_ids):
+    """Call after committing a write that made slots bookable."""
+    slot_cache.invalidate()
+    if not slot_events.count() or not slot_ids:
+        return
+
+    marks = ",".join("?" * len(slot_ids))
+    rows = conn.execute(f"""
+        SELECT id, slot_date, start_time, end_time
+        FROM slots
+        WHERE id IN ({marks})
+        AND is_booked = 0
+        AND slot_date >= ?
+    """, (*slot_ids, date.today().isoformat())).fetchall()
+
+    if rows:
+        slot_events.publish("slot-freed", [dict(r) for r in rows], _rebuilt_etag(conn))
+
+
+def slots_changed():
+    """Call after a schedule rule change: clients reload the whole list."""
+    slot_cache.invalidate()
+    slot_events.publish("resync", None)
+
+
+# ---------------- SSE STREAM ----------------
+def sse_message(event, data):
+    if isinstance(data, bytes):
+        data = data.decode()
+    elif not isinstance(data, str):
+        data = json.dumps(data, separators=(",", ":"))
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+def stream_lifetime(lifetime=STREAM_LIFETIME):
+    """This stream's lifetime; jittered so reconnects don't bunch up."""
+    return lifetime * random.uniform(0.75, 1.0)
+
+
+def stream_events(q, heartbeat=STREAM_HEARTBEAT, lifetime=None):
+    """
+    Generator for /slots/stream on a queue from slot_events.subscribe():
+    a full snapshot on connect, then slot-claimed / slot-freed deltas.
+    Every heartbeat the cached ETag is compared so changes made by
+    other worker processes still reach the client as a fresh snapshot.
+    Ends after `lifetime`; the client reconnects.
+    """
+    ends = time.monotonic() + (lifetime or stream_lifetime())
+    try:
+        etag = None
+        while time.monotonic() < ends:
+            body, current = slot_cache.get()
+            if current != etag:
+                etag = current
+                yield sse_message("snapshot", body)
+            else:
+                yield ": ping\n\n"
+
+            deadline = min(time.monotonic() + heartbeat, ends)
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    event, data, applied = q.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+                if event == "resync":
+                    etag = None
+                    break
+                yield sse_message(event, data)
+                if applied:
+                    etag = applied
+    finally:
+        slot_events.unsubscribe(q)
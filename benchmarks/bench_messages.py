@@ -0,0 +1,80 @@
+"""
+WhatsApp link rendering: chained Jinja .replace + |urlencode
+(the old admin_dashboard.html approach) vs. messages.py.
+
+    python benchmarks/bench_messages.py --cards 200 --repeat 20
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jinja2 import Environment  # noqa: E402
+
+import init_db  # noqa: E402
+from messages import confirmation_link  # noqa: E402
+
+CHAINED = Environment(autoescape=True).from_string("""
+{%- for a in appointments -%}
+https://wa.me/{{ a.mobile }}?text={{ settings.confirmation_message
+  .replace('{{name}}', a.patient_name)
+  .replace('{{code}}', a.confirmation_code)
+  .replace('{{date}}', a.appointment_date)
+  .replace('{{time}}', a.slot_time)
+  .replace('{{meeting_link}}', a.meeting_link)
+  .replace('{{receipt_link}}', url_root ~ 'appointment/pdf/' ~ a.confirmation_code)
+  .replace('{{upload_link}}', url_root ~ 'upload/' ~ a.confirmation_code)
+  | urlencode }}
+{% endfor -%}
+""")
+
+COMPILED = Environment(autoescape=True).from_string("""
+{%- for a in appointments -%}
+{{ confirmation_link(a, settings, url_root) }}
+{% endfor -%}
+""")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cards", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    settings = {
+        "confirmation_message": init_db.confirmation_message,
+        "default_meeting_link": "",
+    }
+    appointments = [
+        {
+            "mobile": f"91987654{i:04d}",
+            "patient_name": f"Patient {i}",
+            "confirmation_code": f"MB-20260207101500-{i:04x}",
+            "appointment_date": "2026-02-07",
+            "slot_time": "10:00-10:15",
+            "meeting_link": "https://meet.google.com/abc-defg-hij",
+        }
+        for i in range(args.cards)
+    ]
+    ctx = {"appointments": appointments, "settings": settings,
+           "url_root": "https://example.org/"}
+
+    old = CHAINED.render(**ctx)
+    new = COMPILED.render(confirmation_link=confirmation_link, **ctx)
+    assert old == new, "renderers disagree"
+
+    for name, template, extra in (
+        ("chained", CHAINED, {}),
+        ("compiled", COMPILED, {"confirmation_link": confirmation_link}),
+    ):
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            template.render(**ctx, **extra)
+        per_card = (time.perf_counter() - started) / (args.repeat * args.cards)
+        print(f"{name:9} {per_card * 1e6:8.2f} µs per card")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Admin search: LIKE scan vs. trigram FTS5 index.
+
+    python benchmarks/bench_search.py --rows 100000 --queries 200
+
+Seeds a throw-away database, then times the dashboard search filter
+both ways for the same random terms.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import init_db  # noqa: E402
+from search import fts_phrase  # noqa: E402
+from seed import FIRST, LAST  # noqa: E402
+
+LIKE_SQL = """
+    SELECT id FROM appointments
+    WHERE (patient_name LIKE ? OR mobile LIKE ? OR confirmation_code LIKE ?)
+    ORDER BY appointment_date DESC LIMIT 50
+"""
+
+FTS_SQL = """
+    SELECT id FROM appointments
+    WHERE id IN (SELECT rowid FROM appointments_fts WHERE appointments_fts MATCH ?)
+    ORDER BY appointment_date DESC LIMIT 50
+"""
+
+
+def seed(conn, rows):
+    rnd = random.Random(42)
+    batch = []
+    for i in range(rows):
+        name = f"{rnd.choice(FIRST)} {rnd.choice(LAST)}"
+        mobile = f"9{rnd.randrange(10**9):09d}"
+        day = f"2025-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}"
+        batch.append((
+            f"MB-{day.replace('-', '')}{i:06d}-{rnd.randrange(16**4):04x}",
+            name, mobile, "-", 0, day, "10:00-10:15", "CONFIRMED", day, day
+        ))
+    conn.executemany("""
+        INSERT INTO appointments (
+            confirmation_code, patient_name, mobile, address, slot_id,
+            appointment_date, slot_time, status, created_at, updated_at
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, batch)
+    conn.commit()
+    return batch
+
+
+def timed(conn, sql, params_for, terms):
+    samples = []
+    for term in terms:
+        started = time.perf_counter()
+        conn.execute(sql, params_for(term)).fetchall()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "mean_ms": round(statistics.mean(samples), 3),
+        "p50_ms": round(samples[len(samples) // 2], 3),
+        "p95_ms": round(samples[int(len(samples) * 0.95) - 1], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    conn = sqlite3.connect(path)
+    init_db.migrate(conn)
+
+    started = time.perf_counter()
+    rows = seed(conn, args.rows)
+    print(f"seeded {args.rows} appointments in {time.perf_counter() - started:.1f}s")
+
+    rnd = random.Random(7)
+    terms = []
+    for _ in range(args.queries):
+        row = rnd.choice(rows)
+        kind = rnd.randrange(3)
+        if kind == 0:
+            terms.append(row[1].split()[rnd.randrange(2)][:5])   # name fragment
+        elif kind == 1:
+            terms.append(row[2][-6:])                            # mobile tail
+        else:
+            terms.append(row[0][-4:])                            # code suffix
+
+    def like(term):
+        return (f"%{term}%",) * 3
+
+    results = {
+        "like": timed(conn, LIKE_SQL, like, terms),
+        "fts": timed(conn, FTS_SQL, lambda t: (fts_phrase(t),), terms),
+    }
+
+    for name, r in results.items():
+        print(f"{name:5} mean {r['mean_ms']:8.3f} ms   p50 {r['p50_ms']:8.3f} ms   p95 {r['p95_ms']:8.3f} ms")
+
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+"""
+Load test of the booking, availability and admin paths.
+
+    python benchmarks/loadtest.py --rows 100000 --threads 8 --requests 500
+    python benchmarks/loadtest.py --mode wsgi --compare benchmarks/results/<old>.json
+    python benchmarks/loadtest.py --mode asgi --idle 2000
+
+Seeds a throw-away database (benchmarks/seed.py), then drives each
+scenario from `--threads` threads, either in-process through the
+Flask test client (`client`) or over HTTP against a threaded WSGI
+server (`wsgi`) or uvicorn serving asgi.py (`asgi`). With --idle N,
+N /slots/stream subscribers stay connected during the run. Reports p50/p95/p99 latency and throughput per
+scenario and writes everything to benchmarks/results/ (gitignored) as JSON, so
+runs on different commits can be compared with --compare.
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import platform
+import queue
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlencode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+ADMIN_LOGIN = {"username": "admin", "password": "admin123"}
+
+
+# =================================================
+# SESSIONS
+# request(method, path, form) -> status code
+# =================================================
+class ClientSession:
+    """In-process, through the Flask test client."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, form=None):
+        response = self.client.open(path, method=method, data=form)
+        response.get_data()
+        response.close()
+        return response.status_code
+
+
+class HttpSession:
+    """Keep-alive HTTP/1.1 connection with a cookie jar of one."""
+
+    def __init__(self, port):
+        self.conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        self.cookie = None
+
+    def request(self, method, path, form=None):
+        headers = {}
+        body = None
+        if form is not None:
+            body = urlencode(form)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        if self.cookie:
+            headers["Cookie"] = self.cookie
+
+        self.conn.request(method, path, body=body, headers=headers)
+        response = self.conn.getresponse()
+        response.read()
+
+        cookie = response.getheader("Set-Cookie")
+        if cookie:
+            self.cookie = cookie.split(";", 1)[0]
+        return response.status
+
+
+# =================================================
+# SCENARIOS
+# fn(session, data, rnd) -> status code
+# =================================================
+def _book(s, data, rnd):
+    try:
+        slot_id = data["free_slots"].get_nowait()
+    except queue.Empty:
+        slot_id = 0     # all taken: measures the rejection path
+    return s.request("POST", "/book", {
+        "slot_id": slot_id,
+        "patient_name": "Load Test",
+        "mobile": f"8{rnd.randrange(10**9):09d}",
+        "address": "-",
+        "consultation_type": "FIRST",
+    })
+
+
+SCENARIOS = {
+    # name: (needs admin login, fn)
+    "slots": (False, lambda s, d, r: s.request("GET", "/slots")),
+    "book": (False, _book),
+    "status": (False, lambda s, d, r: s.request(
+        "POST", "/status", {"confirmation_code": r.choice(d["codes"])})),
+    "history": (False, lambda s, d, r: s.request(
+        "POST", "/history", {"mobile": r.choice(d["mobiles"])})),
+    "admin_dashboard": (True, lambda s, d, r: s.request("GET", "/admin/dashboard")),
+    "appointment_pdf": (False, lambda s, d, r: s.request(
+        "GET", f"/appointment/pdf/{r.choice(d['codes'])}")),
+}
+
+
+def hold_streams(port, n, timeout=30):
+    """Open n /slots/stream subscribers and read their first snapshot."""
+    streams = []
+    for _ in range(n):
+        sock = socket.create_connection(("127.0.0.1", port), timeout=timeout)
+        sock.sendall(b"GET /slots/stream HTTP/1.1\r\nHost: bench\r\n\r\n")
+        streams.append(sock)
+
+    for sock in streams:
+        seen = b""
+        while b"event: snapshot" not in seen:
+            chunk = sock.recv(65536)
+            if not chunk:
+                raise ConnectionError("stream closed before its first snapshot")
+            seen = seen[-64:] + chunk
+    return streams
+
+
+# =================================================
+# RUNNER
+# =================================================
+def percentile(sorted_ms, p):
+    if not sorted_ms:
+        return None
+    # nearest rank
+    k = max(0, math.ceil(p / 100 * len(sorted_ms)) - 1)
+    return round(sorted_ms[k], 3)
+
+
+def run_scenario(name, new_session, data, threads, requests, warmup):
+    admin, fn = SCENARIOS[name]
+    per_thread = [requests // threads + (i < requests % threads) for i in range(threads)]
+    samples = [[] for _ in range(threads)]
+    errors = [0] * threads
+    start = threading.Barrier(threads + 1)
+
+    def worker(i):
+        rnd = random.Random(i)
+        s = new_session()
+        if admin:
+            s.request("POST", "/admin", ADMIN_LOGIN)
+        for _ in range(warmup):
+            fn(s, data, rnd)
+        start.wait()
+        for _ in range(per_thread[i]):
+            t0 = time.perf_counter()
+            status = fn(s, data, rnd)
+            samples[i].append((time.perf_counter() - t0) * 1000)
+            if status >= 500:
+                errors[i] += 1
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for w in workers:
+        w.start()
+    start.wait()
+    t0 = time.perf_counter()
+    for w in workers:
+        w.join()
+    wall = time.perf_counter() - t0
+
+    ms = sorted(x for xs in samples for x in xs)
+    return {
+        "requests": len(ms),
+        "errors": sum(errors),
+        "seconds": round(wall, 3),
+        "throughput_rps": round(len(ms) / wall, 1) if wall else None,
+        "mean_ms": round(sum(ms) / len(ms), 3) if ms else None,
+        "p50_ms": percentile(ms, 50),
+        "p95_ms": percentile(ms, 95),
+        "p99_ms": percentile(ms, 99),
+        "max_ms": round(ms[-1], 3) if ms else None,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results, path):
+    with open(path) as fh:
+        old = json.load(fh)["results"]
+    print(f"\nvs {os.path.basename(path)} (p95 / throughput)")
+    for name, r in results.items():
+        o = old.get(name)
+        if not o or not o.get("p95_ms") or not r["p95_ms"]:
+            continue
+        dp = (r["p95_ms"] - o["p95_ms"]) / o["p95_ms"] * 100
+        dt = (r["throughput_rps"] - o["throughput_rps"]) / o["throughput_rps"] * 100
+        print(f"  {name:16} p95 {o['p95_ms']:8.2f} -> {r['p95_ms']:8.2f} ms ({dp:+6.1f}%)"
+              f"   rps {o['throughput_rps']:8.1f} -> {r['throughput_rps']:8.1f} ({dt:+6.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000,
+                        help="seeded appointments (1k .. 1M)")
+    parser.add_argument("--mode", choices=["client", "wsgi", "asgi"], default="client")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=400,
+                        help="measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=5,
+                        help="unmeasured requests per thread")
+    parser.add_argument("--idle", type=int, default=0,
+                        help="/slots/stream subscribers held open (wsgi / asgi)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--db", help="reuse an already seeded database")
+    parser.add_argument("--out", help="result file (default: benchmarks/results/...)")
+    parser.add_argument("--compare", help="earlier result file to diff against")
+    args = parser.parse_args()
+
+    names = [n for n in args.scenarios.split(",") if n]
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+    if args.idle and args.mode == "client":
+        parser.error("--idle needs --mode wsgi or asgi")
+
+    # Everything the app writes goes to a scratch directory. The
+    # environment must be set before app is imported.
+    work = tempfile.mkdtemp(prefix="medbuddy-bench-")
+    db_path = args.db or os.path.join(work, "bench.db")
+    os.environ["MEDBUDDY_DB"] = db_path
+    os.environ.setdefault("MEDBUDDY_UPLOAD_FOLDER", os.path.join(work, "uploads"))
+    os.environ.setdefault("MEDBUDDY_RECEIPT_CACHE_DIR", os.path.join(work, "receipts"))
+    os.environ.setdefault("MEDBUDDY_OUTBOX_TRANSPORT", "file")
+    os.environ.setdefault("MEDBUDDY_OUTBOX_FILE", os.path.join(work, "outbox.jsonl"))
+    os.environ.setdefault("MEDBUDDY_SLOW_QUERY_MS", "1000")
+    if args.idle:
+        # the held subscribers need the stream (also under wsgi) and room
+        os.environ.setdefault("MEDBUDDY_SLOT_STREAM", "on")
+        os.environ.setdefault("MEDBUDDY_STREAM_MAX", str(args.idle + 100))
+
+    from seed import seed  # noqa: E402  (after MEDBUDDY_DB is set)
+
+    started = time.perf_counter()
+    if args.db:
+        conn = sqlite3.connect(db_path)
+        summary = {
+            "codes": [r[0] for r in conn.execute(
+                "SELECT confirmation_code FROM appointments "
+                "WHERE status IN ('CONFIRMED', 'DONE') LIMIT 100000")],
+            "mobiles": [r[0] for r in conn.execute(
+                "SELECT mobile FROM appointments LIMIT 100000")],
+        }
+        conn.close()
+    else:
+        summary = seed(db_path, args.rows)
+    seed_seconds = time.perf_counter() - started
+
+    from app import create_app  # noqa: E402
+    app = create_app()
+
+    free_slots = queue.Queue()
+    conn = sqlite3.connect(db_path)
+    for (slot_id,) in conn.execute(
+            "SELECT id FROM slots WHERE is_booked = 0 AND slot_date > date('now') ORDER BY id"):
+        free_slots.put(slot_id)
+    conn.close()
+
+    data = {
+        "codes": summary["codes"],
+        "mobiles": summary["mobiles"],
+        "free_slots": free_slots,
+    }
+
+    server = None
+    if args.mode == "wsgi":
+        from werkzeug.serving import WSGIRequestHandler, make_server
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_request(self, *args, **kwargs):
+                pass
+
+        server = make_server("127.0.0.1", 0, app, threaded=True,
+                             request_handler=QuietHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        port = server.server_port
+        new_session = lambda: HttpSession(port)  # noqa: E731
+    elif args.mode == "asgi":
+        import uvicorn
+        from asgi import application
+
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+        server = uvicorn.Server(uvicorn.Config(
+            application, host="127.0.0.1", port=port,
+            log_level="warning", backlog=max(2048, args.idle * 2),
+        ))
+        threading.Thread(target=server.run, daemon=True).start()
+        while not server.started:
+            time.sleep(0.05)
+        new_session = lambda: HttpSession(port)  # noqa: E731
+    else:
+        new_session = lambda: ClientSession(app)  # noqa: E731
+
+    print(f"{args.mode} mode, {args.threads} threads, {args.requests} requests/scenario, "
+          f"{args.rows} rows (seeded in {seed_seconds:.1f}s)")
+
+    streams = []
+    if args.idle:
+        started = time.perf_counter()
+        streams = hold_streams(port, args.idle)
+        print(f"holding {len(streams)} /slots/stream subscribers "
+              f"(opened in {time.perf_counter() - started:.1f}s, "
+              f"{threading.active_count()} threads in this process)")
+    print(f"  {'scenario':16} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'err':>5}")
+
+    results = {}
+    for name in names:
+        r = run_scenario(name, new_session, data, args.threads, args.requests, args.warmup)
+        results[name] = r
+        print(f"  {name:16} {r['throughput_rps']:8.1f} {r['p50_ms']:8.2f} "
+              f"{r['p95_ms']:8.2f} {r['p99_ms']:8.2f} {r['errors']:5d}")
+
+    for sock in streams:
+        sock.close()
+    if server is not None and args.mode == "asgi":
+        server.should_exit = True
+    elif server is not None:
+        server.shutdown()
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "mode": args.mode,
+            "rows": args.rows if not args.db else None,
+            "threads": args.threads,
+            "requests": args.requests,
+            "idle_streams": args.idle,
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+
+    out = args.out or os.path.join(
+        RESULTS_DIR,
+        f"{datetime.now():%Y%m%d-%H%M%S}-{report['meta']['commit']}-{args.mode}-{args.rows}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"results written to {out}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
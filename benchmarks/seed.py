@@ -0,0 +1,159 @@
+"""
+Synthetic data for benchmarks: slots, appointments and reports.
+
+    python benchmarks/seed.py --db /tmp/bench.db --rows 100000
+
+The schema comes from init_db.migrate, so seeded databases always
+match what the app runs against. `rows` is the number of
+appointments (1k .. 1M); every appointment gets a booked slot,
+a quarter of them a report, and `open_slots` free future slots are
+added for /slots and /book.
+"""
+import argparse
+import hashlib
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import init_db  # noqa: E402
+from booking import appointment_starts_at  # noqa: E402
+
+FIRST = ["Asha", "Rahul", "Priya", "Vikram", "Sneha", "Arjun", "Meera",
+         "Rohan", "Kavya", "Aditya", "Pooja", "Sanjay", "Neha", "Kiran"]
+LAST = ["Patil", "Sharma", "Deshmukh", "Kulkarni", "Iyer", "Reddy",
+        "Joshi", "Nair", "Gupta", "Zungare", "Chavan", "Mehta"]
+TIMES = [f"{h:02d}:{m:02d}" for h in range(9, 18) for m in (0, 15, 30, 45)]
+STATUSES = ["CONFIRMED"] * 6 + ["DONE"] * 2 + ["RESERVED", "CANCELLED"]
+
+BATCH = 10_000
+
+
+def _slot_rows(start, days, booked):
+    for d in range(days):
+        day = (start + timedelta(days=d)).isoformat()
+        for t in TIMES:
+            h, m = map(int, t.split(":"))
+            end = f"{h + (m + 15) // 60:02d}:{(m + 15) % 60:02d}"
+            yield (day, t, end, booked)
+
+
+def seed(path, rows, open_slots=2000, seed=42):
+    """
+    Create (or extend) the database at `path`. Returns a summary
+    with the codes and mobiles load tests can pick from.
+    """
+    rnd = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    init_db.migrate(conn)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")   # throw-away data
+
+    # ---- past, booked slots: one per appointment ----
+    per_day = len(TIMES)
+    days = -(-rows // per_day)
+    first_day = date.today() - timedelta(days=days + 1)
+    last_slot = conn.execute("SELECT COALESCE(MAX(id), 0) FROM slots").fetchone()[0]
+    conn.executemany(
+        "INSERT INTO slots (slot_date, start_time, end_time, is_booked) VALUES (?, ?, ?, ?)",
+        _slot_rows(first_day, days, 1)
+    )
+    booked = conn.execute(
+        "SELECT id, slot_date, start_time, end_time FROM slots "
+        "WHERE id > ? ORDER BY id LIMIT ?",
+        (last_slot, rows)
+    ).fetchall()
+
+    # ---- free, future slots ----
+    open_days = -(-open_slots // per_day)
+    conn.executemany(
+        "INSERT INTO slots (slot_date, start_time, end_time, is_booked) VALUES (?, ?, ?, ?)",
+        _slot_rows(date.today() + timedelta(days=1), open_days, 0)
+    )
+    conn.commit()
+
+    # ---- appointments + reports ----
+    codes, mobiles = [], []
+    appts, reports = [], []
+    next_id = (conn.execute("SELECT COALESCE(MAX(id), 0) FROM appointments").fetchone()[0]) + 1
+
+    def flush():
+        conn.executemany("""
+            INSERT INTO appointments (
+                id, confirmation_code, patient_name, mobile, address,
+                slot_id, appointment_date, slot_time, starts_at,
+                consultation_type, amount, status, reminder_sent,
+                created_at, updated_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1, ?, ?)
+        """, appts)
+        conn.executemany("""
+            INSERT INTO medical_reports (
+                confirmation_code, appointment_id, file_name, file_path,
+                sha256, size_bytes, uploaded_at, preview_status
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, 'unsupported')
+        """, reports)
+        conn.commit()
+        appts.clear()
+        reports.clear()
+
+    for i, slot in enumerate(booked):
+        aid = next_id + i
+        status = rnd.choice(STATUSES)
+        code = f"MB-{slot['slot_date'].replace('-', '')}{aid:07d}-{rnd.randrange(16**4):04x}"
+        mobile = f"9{rnd.randrange(10**9):09d}"
+        created = f"{slot['slot_date']}T08:00:00"
+        appts.append((
+            aid, code, f"{rnd.choice(FIRST)} {rnd.choice(LAST)}", mobile, "-",
+            slot["id"], slot["slot_date"], f"{slot['start_time']}-{slot['end_time']}",
+            appointment_starts_at(slot["slot_date"], slot["start_time"]),
+            rnd.choice(["FIRST", "FOLLOWUP"]), 500, status, created, created
+        ))
+        if status in ("CONFIRMED", "DONE"):
+            codes.append(code)
+        mobiles.append(mobile)
+
+        if i % 4 == 0:
+            sha = hashlib.sha256(code.encode()).hexdigest()
+            reports.append((
+                code, aid, "report.pdf", f"uploads/{sha[:2]}/{sha[2:4]}/{sha}.pdf",
+                sha, 120_000, created
+            ))
+
+        if len(appts) >= BATCH:
+            flush()
+    flush()
+
+    conn.execute("PRAGMA optimize")
+    conn.close()
+
+    return {
+        "appointments": len(booked),
+        "open_slots": open_days * per_day,
+        "codes": codes,
+        "mobiles": mobiles,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db", required=True)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--open-slots", type=int, default=2000)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    summary = seed(args.db, args.rows, args.open_slots)
+    print(
+        f"seeded {summary['appointments']} appointments, "
+        f"{summary['open_slots']} open slots into {args.db} "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import sqlite3
+import uuid
+from datetime import datetime, date
+
+from database import immediate
+from schedules import materialize_slot
+from settings import settings_cache
+
+CODE_RETRIES = 3
+
+
+class SlotUnavailable(Exception):
+    pass
+
+
+def appointment_starts_at(slot_date, start_time):
+    """Normalized start timestamp stored in appointments.starts_at."""
+    return f"{slot_date}T{start_time.strip()}:00"
+
+
+# ---------------- CONFIRMATION CODE ----------------
+def generate_code():
+    return f"MB-{datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:4]}"
+
+
+# ---------------- RESERVE ----------------
+def reserve_slot(conn, slot_id, patient_name, mobile, address,
+                 consultation_type="FIRST", on_reserved=None):
+    """
+    Claim a free, non-past slot and create the RESERVED appointment
+    in one IMMEDIATE transaction.
+
+    The claim is a single conditional UPDATE ... WHERE is_booked=0,
+    so of two concurrent requests for the same slot exactly one
+    wins; the other gets SlotUnavailable. A generated slot
+    ('2026-02-07T10:15') is first written to `slots` as booked,
+    under the same write lock. on_reserved(conn, appointment_row)
+    runs inside the transaction, e.g. to queue the outbox message.
+    Returns the confirmation code.
+    """
+    today = date.today().isoformat()
+
+    def work(conn):
+        if str(slot_id).isdigit():
+            slot = conn.execute("""
+                UPDATE slots SET is_booked=1
+                WHERE id=? AND is_booked=0 AND slot_date >= ?
+                RETURNING id, slot_date, start_time, end_time
+            """, (slot_id, today)).fetchone()
+        else:
+            slot = materialize_slot(conn, slot_id, today)
+
+        if not slot:
+            raise SlotUnavailable(slot_id)
+
+        settings = settings_cache.get(conn)
+
+        amount = (
+            settings.followup_amount
+            if consultation_type == "FOLLOWUP"
+            else settings.default_amount
+        )
+
+        now = datetime.now().isoformat()
+
+        for attempt in range(CODE_RETRIES):
+            code = generate_code()
+            try:
+                appointment = conn.execute("""
+                    INSERT INTO appointments (
+                        confirmation_code,
+                        patient_name, mobile, address,
+                        slot_id, appointment_date, slot_time,
+                        starts_at, consultation_type, amount,
+                        status, created_at, updated_at
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'RESERVED', ?, ?)
+                    RETURNING *
+                """, (
+                    code,
+                    patient_name,
+                    mobile,
+                    address,
+                    slot["id"],
+                    slot["slot_date"],
+                    f'{slot["start_time"]}-{slot["end_time"]}',
+                    appointment_starts_at(slot["slot_date"], slot["start_time"]),
+                    consultation_type,
+                    amount,
+                    now,
+                    now
+                )).fetchone()
+            except sqlite3.IntegrityError:
+                # confirmation code collision within the same second
+                if attempt == CODE_RETRIES - 1:
+                    raise
+                continue
+
+            if on_reserved is not None:
+                on_reserved(conn, appointment)
+            return code
+
+    return immediate(conn, work)
@@ -0,0 +1,190 @@
+import os
+from datetime import date, timedelta
+
+from schedules import slots_between
+from search import search_clause
+
+ADMIN_PAGE_SIZE = int(os.environ.get("MEDBUDDY_ADMIN_PAGE_SIZE", "50"))
+MAX_PAGE_SIZE = 200
+SLOT_WINDOW_DAYS = int(os.environ.get("MEDBUDDY_SLOT_WINDOW_DAYS", "60"))
+
+# "materialized" reads the trigger-maintained appointment_stats table,
+# "live" aggregates appointments directly in one pass.
+STATS_SOURCE = os.environ.get("MEDBUDDY_STATS", "materialized")
+
+
+class CursorError(ValueError):
+    pass
+
+
+# ---------------- PAGING HELPERS ----------------
+def page_size(args):
+    try:
+        size = int(args.get("page_size", ADMIN_PAGE_SIZE))
+    except ValueError:
+        size = ADMIN_PAGE_SIZE
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def parse_cursor(value, parts):
+    """'2026-02-07,15' -> ['2026-02-07', 15]; None if absent or malformed."""
+    if not value:
+        return None
+    fields = value.split(",")
+    if len(fields) != parts:
+        return None
+    try:
+        fields[-1] = int(fields[-1])
+    except ValueError:
+        return None
+    return fields
+
+
+def _page(rows, limit, key):
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, ",".join(str(rows[-1][k]) for k in key)
+
+
+# ---------------- APPOINTMENTS ----------------
+def appointment_filters(conn, args):
+    """
+    WHERE fragment and params for the dashboard filters (search,
+    status, consultation type, date range) over `appointments`.
+    Everything that acts on "the current filter" uses this.
+    """
+    search = args.get("search", "")
+    status_filter = args.get("status", "")
+    consult_filter = args.get("consultation_type", "")
+    from_date = args.get("from_date", "")
+    to_date = args.get("to_date", "")
+
+    query = ""
+    params = []
+
+    if search:
+        clause, search_params = search_clause(conn, search)
+        query += clause
+        params.extend(search_params)
+
+    if status_filter:
+        query += " AND status=?"
+        params.append(status_filter)
+
+    if consult_filter:
+        query += " AND consultation_type=?"
+        params.append(consult_filter)
+
+    if from_date:
+        query += " AND appointment_date >= ?"
+        params.append(from_date)
+
+    if to_date:
+        query += " AND appointment_date <= ?"
+        params.append(to_date)
+
+    return query, params
+
+
+def appointment_page(conn, args):
+    """
+    One page of the filtered appointment list, newest first.
+    Keyset-paginated on (appointment_date, id) so every page costs
+    the same regardless of how deep the admin scrolls.
+    Returns (rows, next_cursor).
+    """
+    limit = page_size(args)
+
+    clause, params = appointment_filters(conn, args)
+    query = "SELECT * FROM appointments WHERE 1=1" + clause
+
+    after = parse_cursor(args.get("after"), 2)
+    if after:
+        query += " AND (appointment_date, id) < (?, ?)"
+        params.extend(after)
+
+    query += " ORDER BY appointment_date DESC, id DESC LIMIT ?"
+    params.append(limit + 1)
+
+    rows = conn.execute(query, params).fetchall()
+    return _page(rows, limit, ("appointment_date", "id"))
+
+
+# ---------------- SLOTS ----------------
+def slot_page(conn, args):
+    """
+    Upcoming slots (today .. today + SLOT_WINDOW_DAYS), booked or not,
+    stored and rule-generated alike, paginated on
+    (slot_date, start_time, id). Generated slots only exist once
+    computed, so the window from the cursor's day on is expanded and
+    cut in memory; it is bounded by SLOT_WINDOW_DAYS.
+    Returns (rows, next_cursor); raises CursorError for a cursor
+    whose day is not a date.
+    """
+    today = date.today()
+    limit = page_size(args)
+
+    after = (args.get("after") or "").split(",")
+    after = tuple(after) if len(after) == 3 else None
+    if after:
+        try:
+            first = date.fromisoformat(after[0]).isoformat()
+        except ValueError:
+            raise CursorError(f"Invalid slot cursor: {args['after']!r}")
+    else:
+        first = today.isoformat()
+
+    rows = slots_between(
+        conn, first,
+        (today + timedelta(days=SLOT_WINDOW_DAYS)).isoformat(),
+        include_booked=True
+    )
+    if after:
+        rows = [r for r in rows
+                if (r["slot_date"], r["start_time"], str(r["id"])) > after]
+
+    return _page(rows[:limit + 1], limit, ("slot_date", "start_time", "id"))
+
+
+# ---------------- STATS ----------------
+def dashboard_stats(conn, source=None):
+    """Total / reserved / confirmed / today counters in a single query."""
+    if (source or STATS_SOURCE) == "live":
+        row = conn.execute("""
+            SELECT COUNT(*),
+                   COALESCE(SUM(status = 'RESERVED'), 0),
+                   COALESCE(SUM(status = 'CONFIRMED'), 0),
+                   COALESCE(SUM(appointment_date = DATE('now')), 0)
+            FROM appointments
+        """).fetchone()
+    else:
+        row = conn.execute("""
+            SELECT COALESCE(SUM(n), 0),
+                   COALESCE(SUM(CASE WHEN status = 'RESERVED' THEN n END), 0),
+                   COALESCE(SUM(CASE WHEN status = 'CONFIRMED' THEN n END), 0),
+                   COALESCE(SUM(CASE WHEN appointment_date = DATE('now') THEN n END), 0)
+            FROM appointment_stats
+        """).fetchone()
+
+    return {
+        "total": row[0],
+        "reserved": row[1],
+        "confirmed": row[2],
+        "today": row[3],
+    }
+
+
+def daily_breakdown(conn, from_date, to_date):
+    """{day: {status: count}} for appointment dates in [from_date, to_date]."""
+    rows = conn.execute("""
+        SELECT appointment_date, status, n
+        FROM appointment_stats
+        WHERE appointment_date BETWEEN ? AND ?
+        ORDER BY appointment_date
+    """, (from_date, to_date)).fetchall()
+
+    days = {}
+    for r in rows:
+        days.setdefault(r["appointment_date"], {})[r["status"]] = r["n"]
+    return days
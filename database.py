@@ -0,0 +1,175 @@
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import TimedConnection, QUERY_METRICS
+
+DB = os.environ.get("MEDBUDDY_DB", "medbuddy.db")
+
+POOL_SIZE = int(os.environ.get("MEDBUDDY_DB_POOL_SIZE", "8"))
+POOL_TIMEOUT = 10          # seconds to wait for a free connection
+CACHED_STATEMENTS = 256    # per-connection prepared statement cache
+
+BUSY_RETRIES = 5
+BUSY_BACKOFF = 0.02        # seconds, doubled on every retry
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+def is_busy(exc):
+    msg = str(exc).lower()
+    return "locked" in msg or "busy" in msg
+
+
+def immediate(conn, work, retries=BUSY_RETRIES, backoff=BUSY_BACKOFF):
+    """
+    Run work(conn) inside BEGIN IMMEDIATE and commit.
+
+    Taking the write lock up front avoids the deferred-transaction
+    lock upgrade that fails with "database is locked" under load.
+    Busy errors are retried with bounded, jittered exponential
+    backoff; anything else rolls back and propagates.
+    """
+    for attempt in range(retries + 1):
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            result = work(conn)
+            conn.commit()
+            return result
+        except sqlite3.OperationalError as e:
+            if conn.in_transaction:
+                conn.rollback()
+            if not is_busy(e) or attempt == retries:
+                raise
+            time.sleep(backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+
+
+class ConnectionPool:
+    """
+    Bounded pool of SQLite connections.
+    Pragmas are applied once when a connection is opened,
+    not on every checkout.
+    """
+
+    def __init__(self, path=DB, size=POOL_SIZE, timeout=POOL_TIMEOUT):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+
+        self._acquired = 0
+        self._waits = 0
+        self._wait_seconds = 0.0
+        self._timeouts = 0
+
+    # ---------------- CONNECTIONS ----------------
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=10,          # wait before failing
+            check_same_thread=False,
+            cached_statements=CACHED_STATEMENTS,
+            # per-statement latency / row counts for /metrics
+            factory=TimedConnection if QUERY_METRICS else sqlite3.Connection
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("PRAGMA busy_timeout = 5000;")
+        conn.execute("PRAGMA synchronous = NORMAL;")
+        return conn
+
+    def acquire(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = None
+
+        if conn is None:
+            with self._lock:
+                grow = self._created < self.size
+                if grow:
+                    self._created += 1
+
+            if grow:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                started = time.perf_counter()
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self._timeouts += 1
+                    raise PoolTimeout(
+                        f"No database connection free after {self.timeout}s"
+                    )
+                with self._lock:
+                    self._waits += 1
+                    self._wait_seconds += time.perf_counter() - started
+
+        with self._lock:
+            self._in_use += 1
+            self._acquired += 1
+        return conn
+
+    def release(self, conn):
+        # never hand a half-finished transaction to the next borrower
+        if conn.in_transaction:
+            conn.rollback()
+
+        with self._lock:
+            self._in_use -= 1
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close_all(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+    # ---------------- METRICS ----------------
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self.size,
+                "open": self._created,
+                "in_use": self._in_use,
+                "idle": self._idle.qsize(),
+                "acquired": self._acquired,
+                "waits": self._waits,
+                "wait_seconds": round(self._wait_seconds, 6),
+                "timeouts": self._timeouts,
+            }
+
+
+pool = ConnectionPool()
@@ -1,113 +1,46 @@
 import sqlite3
+import sys
+from datetime import datetime
 
-DB = "medbuddy.db"
-
-conn = sqlite3.connect(DB)
-c = conn.cursor()
+from database import DB
 
 # =================================================
 # HELPER
 # =================================================
-def column_exists(table, column):
+def column_exists(c, table, column):
     c.execute(f"PRAGMA table_info({table})")
     return column in [row[1] for row in c.fetchall()]
 
-# =================================================
-# SLOTS
-# =================================================
-c.execute("""
-CREATE TABLE IF NOT EXISTS slots (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    slot_date TEXT NOT NULL,
-    start_time TEXT NOT NULL,
-    end_time TEXT NOT NULL,
-    is_booked INTEGER DEFAULT 0
-)
-""")
-
-# =================================================
-# APPOINTMENTS
-# =================================================
-c.execute("""
-CREATE TABLE IF NOT EXISTS appointments (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    confirmation_code TEXT UNIQUE,
-
-    patient_name TEXT NOT NULL,
-    mobile TEXT NOT NULL,
-    address TEXT NOT NULL,
-
-    slot_id INTEGER NOT NULL,
-    appointment_date TEXT NOT NULL,
-    slot_time TEXT NOT NULL,
-
-    consultation_type TEXT DEFAULT 'first',
-    amount INTEGER NOT NULL DEFAULT 500,
-    payment_ref TEXT,
 
-    status TEXT NOT NULL DEFAULT 'RESERVED',
-    meeting_link TEXT,
-    admin_remarks TEXT,
-
-    reminder_sent INTEGER DEFAULT 0,
-
-    created_at TEXT NOT NULL,
-    updated_at TEXT NOT NULL
-)
-""")
-
-# =================================================
-# MEDICAL REPORTS
-# =================================================
-c.execute("""
-CREATE TABLE IF NOT EXISTS medical_reports (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    confirmation_code TEXT NOT NULL,
-    appointment_id INTEGER,
-    file_name TEXT NOT NULL,
-    file_path TEXT NOT NULL,
-    uploaded_at TEXT NOT NULL
-)
-""")
-
-# =================================================
-# ADMIN SETTINGS
-# =================================================
-c.execute("""
-CREATE TABLE IF NOT EXISTS admin_settings (
-    id INTEGER PRIMARY KEY,
-    doctor_whatsapp TEXT,
-    upi_link TEXT,
-
-    default_amount INTEGER,
-    followup_amount INTEGER,
-
-    default_meeting_link TEXT,
-
-    reservation_message TEXT,
-    confirmation_message TEXT,
-    reminder_message TEXT
-)
-""")
-
-# =================================================
-# SAFE MIGRATIONS
-# =================================================
+def columns(c, table):
+    c.execute(f"PRAGMA table_info({table})")
+    return [row[1] for row in c.fetchall()]
 
-# ---- appointments ----
-if not column_exists("appointments", "consultation_type"):
-    c.execute("ALTER TABLE appointments ADD COLUMN consultation_type TEXT DEFAULT 'first'")
 
-# ---- admin_settings ----
-if not column_exists("admin_settings", "followup_amount"):
-    c.execute("ALTER TABLE admin_settings ADD COLUMN followup_amount INTEGER DEFAULT 300")
+def archive_table(c, table):
+    """<table>_archive: the same columns (and id key) plus archived_at."""
+    c.execute(f"PRAGMA table_info({table})")
+    defs = ", ".join(
+        f"{name} {type_}{' PRIMARY KEY' if pk else ''}"
+        for _, name, type_, _, _, pk in c.fetchall()
+    )
+    c.execute(f"CREATE TABLE IF NOT EXISTS {table}_archive ({defs}, archived_at TEXT NOT NULL)")
 
-if not column_exists("admin_settings", "default_meeting_link"):
-    c.execute("ALTER TABLE admin_settings ADD COLUMN default_meeting_link TEXT")
 
-# ---- medical_reports ----
-if not column_exists("medical_reports", "appointment_id"):
-    c.execute("ALTER TABLE medical_reports ADD COLUMN appointment_id INTEGER")
+def union_view(c, table):
+    """
+    <table>_all over the live and archived rows. A migration that
+    adds a column to <table> must add it to <table>_archive too and
+    call this again.
+    """
+    cols = ", ".join(columns(c, table))
+    c.execute(f"DROP VIEW IF EXISTS {table}_all")
+    c.execute(f"""
+    CREATE VIEW {table}_all AS
+    SELECT {cols} FROM {table}
+    UNION ALL
+    SELECT {cols} FROM {table}_archive
+    """)
 
 # =================================================
 # DEFAULT MESSAGE TEMPLATES
@@ -154,35 +87,619 @@ reminder_message = (
 )
 
 # =================================================
-# INSERT DEFAULT SETTINGS (ONLY IF EMPTY)
+# MIGRATIONS
+# Each step runs once, in order, inside its own
+# transaction. Append new steps; never edit old ones.
 # =================================================
-c.execute("SELECT COUNT(*) FROM admin_settings")
-if c.fetchone()[0] == 0:
-    c.execute("""
-    INSERT INTO admin_settings (
-        id,
-        doctor_whatsapp,
-        upi_link,
-        default_amount,
-        followup_amount,
-        default_meeting_link,
-        reservation_message,
-        confirmation_message,
-        reminder_message
-    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
-        1,
-        "919588460141",
-        "9588460141@ybl",
-        500,
-        300,
-        "",
-        reservation_message,
-        confirmation_message,
-        reminder_message
-    ))
-
-conn.commit()
-conn.close()
-
-print("✅ Database initialized & migrated successfully")
+
+def m001_base_schema(c):
+    # ---- slots ----
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS slots (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        slot_date TEXT NOT NULL,
+        start_time TEXT NOT NULL,
+        end_time TEXT NOT NULL,
+        is_booked INTEGER DEFAULT 0
+    )
+    """)
+
+    # ---- appointments ----
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS appointments (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        confirmation_code TEXT UNIQUE,
+
+        patient_name TEXT NOT NULL,
+        mobile TEXT NOT NULL,
+        address TEXT NOT NULL,
+
+        slot_id INTEGER NOT NULL,
+        appointment_date TEXT NOT NULL,
+        slot_time TEXT NOT NULL,
+
+        consultation_type TEXT DEFAULT 'first',
+        amount INTEGER NOT NULL DEFAULT 500,
+        payment_ref TEXT,
+
+        status TEXT NOT NULL DEFAULT 'RESERVED',
+        meeting_link TEXT,
+        admin_remarks TEXT,
+
+        reminder_sent INTEGER DEFAULT 0,
+
+        created_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL
+    )
+    """)
+
+    # ---- medical reports ----
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS medical_reports (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        confirmation_code TEXT NOT NULL,
+        appointment_id INTEGER,
+        file_name TEXT NOT NULL,
+        file_path TEXT NOT NULL,
+        uploaded_at TEXT NOT NULL
+    )
+    """)
+
+    # ---- admin settings ----
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS admin_settings (
+        id INTEGER PRIMARY KEY,
+        doctor_whatsapp TEXT,
+        upi_link TEXT,
+
+        default_amount INTEGER,
+        followup_amount INTEGER,
+
+        default_meeting_link TEXT,
+
+        reservation_message TEXT,
+        confirmation_message TEXT,
+        reminder_message TEXT
+    )
+    """)
+
+
+def m002_legacy_columns(c):
+    # Databases created before versioning may predate these columns.
+    if not column_exists(c, "appointments", "consultation_type"):
+        c.execute("ALTER TABLE appointments ADD COLUMN consultation_type TEXT DEFAULT 'first'")
+
+    if not column_exists(c, "admin_settings", "followup_amount"):
+        c.execute("ALTER TABLE admin_settings ADD COLUMN followup_amount INTEGER DEFAULT 300")
+
+    if not column_exists(c, "admin_settings", "default_meeting_link"):
+        c.execute("ALTER TABLE admin_settings ADD COLUMN default_meeting_link TEXT")
+
+    if not column_exists(c, "medical_reports", "appointment_id"):
+        c.execute("ALTER TABLE medical_reports ADD COLUMN appointment_id INTEGER")
+
+
+def m003_default_settings(c):
+    c.execute("SELECT COUNT(*) FROM admin_settings")
+    if c.fetchone()[0] == 0:
+        c.execute("""
+        INSERT INTO admin_settings (
+            id,
+            doctor_whatsapp,
+            upi_link,
+            default_amount,
+            followup_amount,
+            default_meeting_link,
+            reservation_message,
+            confirmation_message,
+            reminder_message
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            1,
+            "919588460141",
+            "9588460141@ybl",
+            500,
+            300,
+            "",
+            reservation_message,
+            confirmation_message,
+            reminder_message
+        ))
+
+
+def m004_query_indexes(c):
+    # /slots: is_booked=0 AND slot_date>=? ORDER BY slot_date,start_time
+    c.execute("""
+    CREATE INDEX IF NOT EXISTS idx_slots_open
+    ON slots (slot_date, start_time) WHERE is_booked = 0
+    """)
+
+    # /history: mobile=? ORDER BY created_at DESC
+    c.execute("""
+    CREATE INDEX IF NOT EXISTS idx_appointments_mobile
+    ON appointments (mobile, created_at)
+    """)
+
+    # dashboard counters / filters and both scheduler jobs
+    c.execute("""
+    CREATE INDEX IF NOT EXISTS idx_appointments_status
+    ON appointments (status, created_at)
+    """)
+
+    # dashboard listing and "today" counter
+    c.execute("""
+    CREATE INDEX IF NOT EXISTS idx_appointments_date
+    ON appointments (appointment_date)
+    """)
+
+    # /admin/reports/<code>
+    c.execute("""
+    CREATE INDEX IF NOT EXISTS idx_reports_code
+    ON medical_reports (confirmation_code, uploaded_at)
+    """)
+
+
+def m005_appointment_starts_at(c):
+    # normalized start timestamp, e.g. 2026-02-07T10:30:00
+    if not column_exists(c, "appointments", "starts_at"):
+        c.execute("ALTER TABLE appointments ADD COLUMN starts_at TEXT")
+
+    c.execute("""
+    UPDATE appointments
+    SET starts_at = appointment_date || 'T' ||
+        TRIM(SUBSTR(slot_time, 1, INSTR(slot_time || '-', '-') - 1)) || ':00'
+    WHERE starts_at IS NULL
+    """)
+
+    # send_reminders: only unreminded, confirmed rows, by start time
+    c.execute("""
+    CREATE INDEX IF NOT EXISTS idx_appointments_reminder_due
+    ON appointments (starts_at)
+    WHERE status = 'CONFIRMED' AND reminder_sent = 0
+    """)
+
+
+def m006_dashboard_indexes(c):
+    # admin dashboard: upcoming slot window, booked or free
+    c.execute("""
+    CREATE INDEX IF NOT EXISTS idx_slots_date
+    ON slots (slot_date, start_time)
+    """)
+
+
+def m007_appointment_stats(c):
+    # materialized dashboard counters, one row per (day, status)
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS appointment_stats (
+        appointment_date TEXT NOT NULL,
+        status TEXT NOT NULL,
+        n INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (appointment_date, status)
+    ) WITHOUT ROWID
+    """)
+
+    c.execute("DELETE FROM appointment_stats")
+    c.execute("""
+    INSERT INTO appointment_stats (appointment_date, status, n)
+    SELECT appointment_date, status, COUNT(*)
+    FROM appointments
+    GROUP BY appointment_date, status
+    """)
+
+    c.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_appointment_stats_insert
+    AFTER INSERT ON appointments
+    BEGIN
+        INSERT INTO appointment_stats (appointment_date, status, n)
+        VALUES (NEW.appointment_date, NEW.status, 1)
+        ON CONFLICT (appointment_date, status) DO UPDATE SET n = n + 1;
+    END
+    """)
+
+    c.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_appointment_stats_delete
+    AFTER DELETE ON appointments
+    BEGIN
+        UPDATE appointment_stats SET n = n - 1
+        WHERE appointment_date = OLD.appointment_date AND status = OLD.status;
+        DELETE FROM appointment_stats
+        WHERE appointment_date = OLD.appointment_date AND status = OLD.status
+          AND n <= 0;
+    END
+    """)
+
+    c.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_appointment_stats_update
+    AFTER UPDATE OF status, appointment_date ON appointments
+    WHEN OLD.status IS NOT NEW.status
+      OR OLD.appointment_date IS NOT NEW.appointment_date
+    BEGIN
+        UPDATE appointment_stats SET n = n - 1
+        WHERE appointment_date = OLD.appointment_date AND status = OLD.status;
+        DELETE FROM appointment_stats
+        WHERE appointment_date = OLD.appointment_date AND status = OLD.status
+          AND n <= 0;
+        INSERT INTO appointment_stats (appointment_date, status, n)
+        VALUES (NEW.appointment_date, NEW.status, 1)
+        ON CONFLICT (appointment_date, status) DO UPDATE SET n = n + 1;
+    END
+    """)
+
+
+def m008_appointments_fts(c):
+    # trigram full-text index for the admin search box
+    try:
+        c.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS appointments_fts USING fts5(
+            patient_name, mobile, confirmation_code,
+            content='appointments', content_rowid='id',
+            tokenize='trigram'
+        )
+        """)
+    except sqlite3.OperationalError:
+        # SQLite < 3.34 or built without FTS5: search keeps using LIKE
+        return
+
+    c.execute("INSERT INTO appointments_fts (appointments_fts) VALUES ('rebuild')")
+
+    c.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_appointments_fts_insert
+    AFTER INSERT ON appointments
+    BEGIN
+        INSERT INTO appointments_fts (rowid, patient_name, mobile, confirmation_code)
+        VALUES (NEW.id, NEW.patient_name, NEW.mobile, NEW.confirmation_code);
+    END
+    """)
+
+    c.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_appointments_fts_delete
+    AFTER DELETE ON appointments
+    BEGIN
+        INSERT INTO appointments_fts
+            (appointments_fts, rowid, patient_name, mobile, confirmation_code)
+        VALUES ('delete', OLD.id, OLD.patient_name, OLD.mobile, OLD.confirmation_code);
+    END
+    """)
+
+    c.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_appointments_fts_update
+    AFTER UPDATE OF patient_name, mobile, confirmation_code ON appointments
+    BEGIN
+        INSERT INTO appointments_fts
+            (appointments_fts, rowid, patient_name, mobile, confirmation_code)
+        VALUES ('delete', OLD.id, OLD.patient_name, OLD.mobile, OLD.confirmation_code);
+        INSERT INTO appointments_fts (rowid, patient_name, mobile, confirmation_code)
+        VALUES (NEW.id, NEW.patient_name, NEW.mobile, NEW.confirmation_code);
+    END
+    """)
+
+
+def m009_report_content_hash(c):
+    # content-addressed uploads: hash + size drive dedupe and quotas
+    if not column_exists(c, "medical_reports", "sha256"):
+        c.execute("ALTER TABLE medical_reports ADD COLUMN sha256 TEXT")
+
+    if not column_exists(c, "medical_reports", "size_bytes"):
+        c.execute("ALTER TABLE medical_reports ADD COLUMN size_bytes INTEGER NOT NULL DEFAULT 0")
+
+    c.execute("""
+    CREATE INDEX IF NOT EXISTS idx_reports_sha256
+    ON medical_reports (sha256)
+    """)
+
+
+def m010_report_path_index(c):
+    # /uploads/<path> access check
+    c.execute("""
+    CREATE INDEX IF NOT EXISTS idx_reports_file_path
+    ON medical_reports (file_path)
+    """)
+
+
+def m011_report_previews(c):
+    # background thumbnails: pending -> ready / unsupported / failed
+    if not column_exists(c, "medical_reports", "preview_status"):
+        c.execute("ALTER TABLE medical_reports ADD COLUMN preview_status TEXT NOT NULL DEFAULT 'pending'")
+
+    if not column_exists(c, "medical_reports", "preview_path"):
+        c.execute("ALTER TABLE medical_reports ADD COLUMN preview_path TEXT")
+
+    c.execute("""
+    CREATE INDEX IF NOT EXISTS idx_reports_preview_pending
+    ON medical_reports (id) WHERE preview_status = 'pending'
+    """)
+
+
+def m012_outbox(c):
+    # outbound notifications, delivered by scheduler.deliver_outbox
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        idempotency_key TEXT NOT NULL UNIQUE,
+        kind TEXT NOT NULL,
+        recipient TEXT NOT NULL,
+        body TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at TEXT NOT NULL,
+        last_error TEXT,
+        created_at TEXT NOT NULL,
+        sent_at TEXT
+    )
+    """)
+
+    c.execute("""
+    CREATE INDEX IF NOT EXISTS idx_outbox_due
+    ON outbox (next_attempt_at) WHERE status IN ('pending', 'sending')
+    """)
+
+
+def m013_slot_rules(c):
+    # recurring schedules, expanded on read (schedules.slots_between);
+    # `slots` rows are only created for manual slots and bookings
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS slot_rules (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        start_date TEXT NOT NULL,
+        end_date TEXT NOT NULL,
+        weekdays INTEGER NOT NULL,          -- bit 0 = Monday
+        window_start TEXT NOT NULL,
+        window_end TEXT NOT NULL,
+        slot_minutes INTEGER NOT NULL,
+        breaks TEXT NOT NULL DEFAULT '',    -- "13:00-14:00,..."
+        holidays TEXT NOT NULL DEFAULT '',  -- "2026-01-26,..."
+        created_at TEXT NOT NULL
+    )
+    """)
+
+    c.execute("""
+    CREATE INDEX IF NOT EXISTS idx_slot_rules_end
+    ON slot_rules (end_date)
+    """)
+
+    # generated slots the admin removed
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS slot_exceptions (
+        slot_date TEXT NOT NULL,
+        start_time TEXT NOT NULL,
+        PRIMARY KEY (slot_date, start_time)
+    ) WITHOUT ROWID
+    """)
+
+
+def m014_settings_version(c):
+    # bumped on every update; settings.SettingsCache compares it
+    if not column_exists(c, "admin_settings", "version"):
+        c.execute("ALTER TABLE admin_settings ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
+
+def m015_scheduler_lease(c):
+    # which process runs the scheduled jobs (scheduler.LeaderLease)
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS scheduler_lease (
+        name TEXT PRIMARY KEY,
+        owner TEXT NOT NULL,
+        expires_at TEXT NOT NULL
+    )
+    """)
+
+
+def m016_archive(c):
+    # cold storage for past appointments, their reports and slots
+    # (archive.py); /history, /status and report lookups read *_all
+    for table in ("appointments", "medical_reports", "slots"):
+        archive_table(c, table)
+
+    c.execute("""
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_appointments_archive_code
+    ON appointments_archive (confirmation_code)
+    """)
+    c.execute("""
+    CREATE INDEX IF NOT EXISTS idx_appointments_archive_mobile
+    ON appointments_archive (mobile, created_at)
+    """)
+    c.execute("""
+    CREATE INDEX IF NOT EXISTS idx_reports_archive_code
+    ON medical_reports_archive (confirmation_code, uploaded_at)
+    """)
+    c.execute("""
+    CREATE INDEX IF NOT EXISTS idx_reports_archive_file_path
+    ON medical_reports_archive (file_path)
+    """)
+
+    union_view(c, "appointments")
+    union_view(c, "medical_reports")
+
+    # moving a row to the archive is not a delete: the dashboard
+    # counters keep counting it
+    c.execute("DROP TRIGGER IF EXISTS trg_appointment_stats_delete")
+    c.execute("""
+    CREATE TRIGGER trg_appointment_stats_delete
+    AFTER DELETE ON appointments
+    WHEN NOT EXISTS (SELECT 1 FROM appointments_archive WHERE id = OLD.id)
+    BEGIN
+        UPDATE appointment_stats SET n = n - 1
+        WHERE appointment_date = OLD.appointment_date AND status = OLD.status;
+        DELETE FROM appointment_stats
+        WHERE appointment_date = OLD.appointment_date AND status = OLD.status
+          AND n <= 0;
+    END
+    """)
+
+
+def m017_drop_open_slots_index(c):
+    # slots_between reads open and booked slots alike through
+    # idx_slots_date; the partial index only slowed down writes
+    c.execute("DROP INDEX IF EXISTS idx_slots_open")
+
+
+MIGRATIONS = [
+    (1, m001_base_schema),
+    (2, m002_legacy_columns),
+    (3, m003_default_settings),
+    (4, m004_query_indexes),
+    (5, m005_appointment_starts_at),
+    (6, m006_dashboard_indexes),
+    (7, m007_appointment_stats),
+    (8, m008_appointments_fts),
+    (9, m009_report_content_hash),
+    (10, m010_report_path_index),
+    (11, m011_report_previews),
+    (12, m012_outbox),
+    (13, m013_slot_rules),
+    (14, m014_settings_version),
+    (15, m015_scheduler_lease),
+    (16, m016_archive),
+    (17, m017_drop_open_slots_index),
+]
+
+# =================================================
+# RUNNER
+# =================================================
+def current_version(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at TEXT NOT NULL
+    )
+    """)
+    conn.commit()
+    return conn.execute(
+        "SELECT COALESCE(MAX(version), 0) FROM schema_version"
+    ).fetchone()[0]
+
+
+def migrate(conn):
+    """
+    Apply every pending migration. Safe to call on each start-up
+    and from several processes at once: each step re-checks the
+    version under BEGIN IMMEDIATE before running.
+    Returns the list of versions applied.
+    """
+    applied = []
+    if current_version(conn) >= MIGRATIONS[-1][0]:
+        return applied
+
+    for version, step in MIGRATIONS:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            done = conn.execute(
+                "SELECT 1 FROM schema_version WHERE version=?",
+                (version,)
+            ).fetchone()
+
+            if not done:
+                step(conn.cursor())
+                conn.execute(
+                    "INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)",
+                    (version, step.__name__, datetime.now().isoformat())
+                )
+                applied.append(version)
+
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    return applied
+
+# =================================================
+# QUERY PLAN CHECK
+# Hot queries must be served from an index, never a
+# full table scan. Run: python init_db.py --check
+# (also tests/test_query_plans.py)
+# =================================================
+HOT_QUERIES = {
+    "slots": (
+        "SELECT id, slot_date, start_time, end_time, is_booked FROM slots "
+        "WHERE slot_date BETWEEN ? AND ? "
+        "ORDER BY slot_date, start_time, id",
+        ("2000-01-01", "9999-12-31")
+    ),
+    "slot_rules": (
+        "SELECT * FROM slot_rules WHERE end_date >= ? AND start_date <= ?",
+        ("2000-01-01", "9999-12-31")
+    ),
+    "history": (
+        "SELECT * FROM appointments_all WHERE mobile=? ORDER BY created_at DESC",
+        ("0000000000",)
+    ),
+    "status": (
+        "SELECT * FROM appointments_all WHERE confirmation_code=?",
+        ("MB-0",)
+    ),
+    "admin_reports": (
+        "SELECT * FROM medical_reports_all WHERE confirmation_code=? "
+        "ORDER BY uploaded_at DESC",
+        ("MB-0",)
+    ),
+    "report_file": (
+        "SELECT file_name, sha256 FROM medical_reports_all WHERE file_path=? LIMIT 1",
+        ("uploads/x",)
+    ),
+    "dashboard_appointments": (
+        "SELECT * FROM appointments WHERE (appointment_date, id) < (?, ?) "
+        "ORDER BY appointment_date DESC, id DESC LIMIT ?",
+        ("2000-01-01", 0, 51)
+    ),
+    "expire_reserved": (
+        "SELECT id FROM appointments WHERE status = 'RESERVED' "
+        "AND created_at < ? ORDER BY created_at LIMIT ?",
+        ("2000-01-01", 500)
+    ),
+    "send_reminders": (
+        "SELECT id FROM appointments "
+        "WHERE status = 'CONFIRMED' AND reminder_sent = 0 "
+        "AND starts_at BETWEEN ? AND ?",
+        ("2000-01-01T00:00:00", "2000-01-01T00:30:00")
+    ),
+    "archive_appointments": (
+        "SELECT id FROM appointments WHERE appointment_date < ? "
+        "ORDER BY appointment_date LIMIT ?",
+        ("2000-01-01", 500)
+    ),
+    "archive_slots": (
+        "SELECT id FROM slots WHERE slot_date < ? LIMIT ?",
+        ("2000-01-01", 500)
+    ),
+    "outbox_due": (
+        "SELECT id FROM outbox WHERE status IN ('pending', 'sending') "
+        "AND next_attempt_at <= ? ORDER BY next_attempt_at LIMIT ?",
+        ("2000-01-01T00:00:00", 50)
+    ),
+}
+
+
+def full_scans(conn, queries=None):
+    """
+    Return {name: plan_detail} for every hot query whose plan
+    walks a whole table, directly or through an index
+    ("SCAN t USING COVERING INDEX ..." reads every entry too).
+    """
+    offenders = {}
+    for name, (sql, params) in (queries or HOT_QUERIES).items():
+        for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params):
+            detail = row[3]
+            if detail.startswith("SCAN ") and not detail.startswith(
+                    ("SCAN CONSTANT ROW", "SCAN (")):
+                offenders[name] = detail
+    return offenders
+
+
+if __name__ == "__main__":
+    conn = sqlite3.connect(DB)
+    applied = migrate(conn)
+
+    if "--check" in sys.argv:
+        offenders = full_scans(conn)
+        conn.close()
+        for name, detail in offenders.items():
+            print(f"❌ {name}: {detail}")
+        if offenders:
+            sys.exit(1)
+        print("✅ No hot query does a full table scan")
+        sys.exit(0)
+
+    conn.close()
+    print(f"✅ Database initialized & migrated successfully (applied: {applied or 'none'})")
@@ -0,0 +1,127 @@
+import re
+from functools import lru_cache
+from urllib.parse import quote
+
+PLACEHOLDER = re.compile(r"\{\{(\w+)\}\}")
+
+CANCEL_MESSAGE = (
+    "Appointment Cancelled by Patient\n\n"
+    "Confirmation No: {{code}}\n"
+    "Patient: {{name}}\n"
+    "Date: {{date}}\n"
+    "Time: {{time}}\n\n"
+    "Please cancel/delete this appointment from admin panel."
+)
+
+
+def _encode(text):
+    # same encoding as Jinja's |urlencode on a string
+    return quote(text, safe="/")
+
+
+@lru_cache(maxsize=64)
+def compile_template(text):
+    """
+    Split an admin message template into literal and placeholder
+    parts, with the literals already URL-encoded. Keyed on the text
+    itself, so editing a template in settings simply compiles anew.
+    """
+    parts = []
+    pos = 0
+    for m in PLACEHOLDER.finditer(text or ""):
+        if m.start() > pos:
+            parts.append((True, _encode(text[pos:m.start()])))
+        parts.append((False, m.group(1)))
+        pos = m.end()
+    if pos < len(text or ""):
+        parts.append((True, _encode(text[pos:])))
+    return tuple(parts)
+
+
+def render_encoded(text, values):
+    """
+    Fill placeholders and URL-encode in one pass. Unknown
+    placeholders are left as written, like the old .replace chain.
+    """
+    out = []
+    for literal, part in compile_template(text):
+        if literal:
+            out.append(part)
+        elif part in values:
+            out.append(_encode(str(values[part])))
+        else:
+            out.append(_encode("{{" + part + "}}"))
+    return "".join(out)
+
+
+def wa_link(number, text, values):
+    return f"https://wa.me/{number}?text={render_encoded(text, values)}"
+
+
+def render_text(text, values):
+    """Plain (not URL-encoded) message body, for the outbox."""
+    return PLACEHOLDER.sub(
+        lambda m: str(values[m.group(1)]) if m.group(1) in values else m.group(0),
+        text or ""
+    )
+
+
+def clear_compiled():
+    compile_template.cache_clear()
+
+
+# ---------------- APPOINTMENT MESSAGES ----------------
+def reservation_values(a, settings):
+    return {
+        "name": a["patient_name"],
+        "date": a["appointment_date"],
+        "time": a["slot_time"],
+        "amount": a["amount"],
+        "upi": settings["upi_link"],
+    }
+
+
+def confirmation_values(a, settings, url_root):
+    meet = (
+        a["meeting_link"]
+        or settings["default_meeting_link"]
+        or "Will be shared soon"
+    )
+    code = a["confirmation_code"]
+    return {
+        "name": a["patient_name"],
+        "code": code,
+        "date": a["appointment_date"],
+        "time": a["slot_time"],
+        "meeting_link": meet,
+        "receipt_link": f"{url_root}appointment/pdf/{code}",
+        "upload_link": f"{url_root}upload/{code}",
+    }
+
+
+def reminder_values(a):
+    return {
+        "name": a["patient_name"],
+        "date": a["appointment_date"],
+        "time": a["slot_time"],
+    }
+
+
+# ---------------- APPOINTMENT LINKS ----------------
+def reservation_link(a, settings):
+    return wa_link(a["mobile"], settings["reservation_message"],
+                   reservation_values(a, settings))
+
+
+def confirmation_link(a, settings, url_root):
+    return wa_link(a["mobile"], settings["confirmation_message"],
+                   confirmation_values(a, settings, url_root))
+
+
+def cancel_link(doctor_number, appt):
+    return wa_link(doctor_number, CANCEL_MESSAGE, {
+        "code": appt["confirmation_code"],
+        "name": appt["patient_name"],
+        "date": appt["appointment_date"],
+        "time": appt["slot_time"],
+    })
@@ -0,0 +1,356 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from functools import lru_cache, wraps
+
+# statements slower than this are printed (0 logs everything)
+SLOW_QUERY_MS = float(os.environ.get("MEDBUDDY_SLOW_QUERY_MS", "100"))
+# MEDBUDDY_QUERY_METRICS=0 opens plain connections, no per-statement timing
+QUERY_METRICS = os.environ.get("MEDBUDDY_QUERY_METRICS", "1") != "0"
+
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+# =================================================
+# METRIC TYPES
+# In-process only: with several worker processes each
+# one exposes its own numbers, like the pool stats.
+# =================================================
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def lines(self):
+        with self._lock:
+            items = list(self._values.items())
+        for values, n in items:
+            yield f"{self.name}{_labels(self.labels, values)} {_number(n)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, *labelvalues):
+        with self._lock:
+            self._values[labelvalues] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}       # labelvalues -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def lines(self):
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        for values, series in items:
+            cumulative = 0
+            for le, n in zip(self.buckets, series):
+                cumulative += n
+                yield (f"{self.name}_bucket"
+                       f"{_labels(self.labels, values, [('le', _number(le))])} {cumulative}")
+            yield (f"{self.name}_bucket"
+                   f"{_labels(self.labels, values, [('le', '+Inf')])} {series[-1]}")
+            yield f"{self.name}_sum{_labels(self.labels, values)} {_number(series[-2])}"
+            yield f"{self.name}_count{_labels(self.labels, values)} {series[-1]}"
+
+
+# =================================================
+# REGISTRY
+# =================================================
+_metrics = []
+_collectors = []
+
+
+def _register(metric):
+    _metrics.append(metric)
+    return metric
+
+
+def register_collector(prefix, stats, help=""):
+    """
+    Expose a stats() dict (pool, caches, ...) as gauges named
+    medbuddy_<prefix>_<key>, read at scrape time. Non-numeric
+    values are skipped.
+    """
+    _collectors.append((prefix, stats, help))
+
+
+def render():
+    """Everything in the Prometheus text exposition format."""
+    out = []
+    for m in _metrics:
+        out.append(f"# HELP {m.name} {m.help}")
+        out.append(f"# TYPE {m.name} {m.kind}")
+        out.extend(m.lines())
+
+    for prefix, stats, help in _collectors:
+        try:
+            values = stats()
+        except Exception as e:
+            print(f"📈 Metrics collector {prefix} failed: {e}")
+            continue
+        for key, value in values.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            name = f"medbuddy_{prefix}_{key}"
+            if help:
+                out.append(f"# HELP {name} {help}")
+            out.append(f"# TYPE {name} gauge")
+            out.append(f"{name} {_number(value)}")
+
+    return "\n".join(out) + "\n"
+
+
+# =================================================
+# HTTP
+# =================================================
+http_duration = _register(Histogram(
+    "medbuddy_http_request_duration_seconds",
+    "Request handling time by endpoint.",
+    ("endpoint", "method", "status"),
+))
+http_in_flight = _register(Gauge(
+    "medbuddy_http_requests_in_flight",
+    "Requests currently being handled.",
+))
+
+
+def request_started():
+    http_in_flight.inc()
+    return time.perf_counter()
+
+
+def request_finished(started, endpoint, method, status):
+    http_duration.observe(time.perf_counter() - started, endpoint, method, status)
+    http_in_flight.inc(amount=-1)
+
+
+# =================================================
+# QUERIES
+# =================================================
+query_duration = _register(Histogram(
+    "medbuddy_db_query_duration_seconds",
+    "SQLite statement execution time (to the first row).",
+    ("statement",),
+))
+query_rows = _register(Counter(
+    "medbuddy_db_query_rows_total",
+    "Rows returned (reads) or changed (writes) per statement.",
+    ("statement",),
+))
+slow_queries = _register(Counter(
+    "medbuddy_db_slow_queries_total",
+    "Statements slower than MEDBUDDY_SLOW_QUERY_MS.",
+    ("statement",),
+))
+
+_PARAM_LIST = re.compile(r"\?(\s*,\s*\?)+")
+_DDL = re.compile(r"\s*(CREATE|DROP|ALTER)\b", re.IGNORECASE)
+
+
+@lru_cache(maxsize=1024)
+def statement_label(sql):
+    """
+    One line of SQL with IN (?, ?, ...) lists folded, as a label.
+    Schema changes (migrations) share the single label "ddl".
+    """
+    if _DDL.match(sql):
+        return "ddl"
+    return _PARAM_LIST.sub("?...", " ".join(sql.split()))[:200]
+
+
+def observe_query(sql, seconds, rows, label=None):
+    label = label or statement_label(sql)
+    query_duration.observe(seconds, label)
+    if rows > 0:
+        query_rows.inc(label, amount=rows)
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        slow_queries.inc(label)
+        print(f"🐢 Slow query ({seconds * 1000:.1f} ms): {label}")
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Records each statement's latency; rows are counted as fetched."""
+
+    _label = None
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._label = statement_label(sql)
+            observe_query(sql, time.perf_counter() - started, self.rowcount)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._label = statement_label(sql)
+            observe_query(sql, time.perf_counter() - started, self.rowcount)
+
+    def _fetched(self, n):
+        if n and self._label is not None:
+            query_rows.inc(self._label, amount=n)
+
+    def fetchone(self):
+        row = super().fetchone()
+        self._fetched(row is not None)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        self._fetched(len(rows))
+        return rows
+
+    def __next__(self):
+        row = super().__next__()
+        self._fetched(1)
+        return row
+
+
+class TimedConnection(sqlite3.Connection):
+    """
+    conn.execute() and friends go through TimedCursor. The shortcuts
+    are overridden too: sqlite3.Connection.execute() builds its cursor
+    internally and never calls cursor().
+    """
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        started = time.perf_counter()
+        try:
+            return self.cursor().executescript(sql_script)
+        finally:
+            # scripts are migrations: one label, not one per script
+            observe_query(sql_script, time.perf_counter() - started, -1, label="ddl")
+
+
+# =================================================
+# PDF RENDERING
+# =================================================
+pdf_render_duration = _register(Histogram(
+    "medbuddy_pdf_render_duration_seconds",
+    "ReportLab time per render, measured in the worker.",
+    ("pool",),
+))
+pdf_queue_duration = _register(Histogram(
+    "medbuddy_pdf_queue_duration_seconds",
+    "Time a render waited for a worker (and its result to come back).",
+    ("pool",),
+))
+pdf_rejected = _register(Counter(
+    "medbuddy_pdf_rejected_total",
+    "Renders refused with 503 because the queue was full.",
+    ("pool",),
+))
+
+
+# =================================================
+# JOBS
+# =================================================
+job_duration = _register(Histogram(
+    "medbuddy_job_duration_seconds",
+    "Background job run time.",
+    ("job",),
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0),
+))
+job_runs = _register(Counter(
+    "medbuddy_job_runs_total",
+    "Background job runs by outcome.",
+    ("job", "outcome"),
+))
+job_result = _register(Gauge(
+    "medbuddy_job_last_result",
+    "Counts returned by the last successful run.",
+    ("job", "key"),
+))
+
+
+def timed_job(fn):
+    """Time a scheduler job and keep the counts it returns."""
+    name = fn.__name__
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            job_runs.inc(name, "error")
+            raise
+        finally:
+            job_duration.observe(time.perf_counter() - started, name)
+
+        job_runs.inc(name, "ok")
+        if isinstance(result, dict):
+            for key, value in result.items():
+                job_result.set(value, name, key)
+        elif isinstance(result, int):
+            job_result.set(result, name, "count")
+        return result
+
+    return wrapper
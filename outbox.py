@@ -0,0 +1,226 @@
+import json
+import os
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from database import immediate
+
+# "http" POSTs each message to MEDBUDDY_OUTBOX_URL; "file" appends
+# JSON lines to MEDBUDDY_OUTBOX_FILE (local development only: the
+# file holds phone numbers and message bodies). Unset, nothing is
+# sent and messages stay pending.
+OUTBOX_TRANSPORT = os.environ.get("MEDBUDDY_OUTBOX_TRANSPORT", "")
+OUTBOX_FILE = os.environ.get("MEDBUDDY_OUTBOX_FILE", "outbox.jsonl")
+OUTBOX_URL = os.environ.get("MEDBUDDY_OUTBOX_URL", "")
+OUTBOX_HTTP_TIMEOUT = 10   # seconds
+
+OUTBOX_BATCH = int(os.environ.get("MEDBUDDY_OUTBOX_BATCH", "50"))
+OUTBOX_CONCURRENCY = int(os.environ.get("MEDBUDDY_OUTBOX_CONCURRENCY", "4"))
+
+MAX_ATTEMPTS = 6
+RETRY_BACKOFF = timedelta(seconds=30)   # doubled on every attempt
+RETRY_BACKOFF_MAX = timedelta(hours=1)
+SEND_LEASE = timedelta(minutes=5)       # a crashed sender's rows come back after this
+
+# outbox.status
+PENDING = "pending"
+SENDING = "sending"
+SENT = "sent"
+DEAD = "dead"
+
+
+class DeliveryError(Exception):
+    pass
+
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+
+# =================================================
+# ENQUEUE
+# =================================================
+def enqueue(conn, key, kind, recipient, body):
+    """
+    Queue one message. `key` is the idempotency key: a second
+    enqueue with the same key is ignored, so retried requests and
+    re-run jobs never message a patient twice.
+
+    Does not commit — call it inside the caller's transaction so the
+    message is queued if and only if the change that caused it is.
+    Returns True if the message was new.
+    """
+    cur = conn.execute("""
+        INSERT INTO outbox (
+            idempotency_key, kind, recipient, body,
+            status, next_attempt_at, created_at
+        ) VALUES (?, ?, ?, ?, 'pending', ?, ?)
+        ON CONFLICT (idempotency_key) DO NOTHING
+    """, (key, kind, recipient, body, _now(), _now()))
+    return cur.rowcount == 1
+
+
+# =================================================
+# TRANSPORTS
+# A transport has send(message) and raises on failure.
+# `message` has id, idempotency_key, kind, recipient, body.
+# =================================================
+class FileTransport:
+    """Local stub: one JSON line per delivered message."""
+
+    def __init__(self, path=OUTBOX_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def send(self, message):
+        line = json.dumps({**message, "sent_at": _now()}, ensure_ascii=False)
+        with self._lock, open(self.path, "a", encoding="utf-8") as fh:
+            fh.write(line + "\n")
+
+
+class HttpTransport:
+    """
+    POSTs the message as JSON. The idempotency key travels as a
+    header so a gateway can drop a resend of an accepted message.
+    """
+
+    def __init__(self, url=OUTBOX_URL, timeout=OUTBOX_HTTP_TIMEOUT):
+        if not url:
+            raise ValueError("MEDBUDDY_OUTBOX_URL is not set")
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, message):
+        req = urllib.request.Request(
+            self.url,
+            data=json.dumps(message).encode(),
+            headers={
+                "Content-Type": "application/json",
+                "Idempotency-Key": message["idempotency_key"],
+            },
+            method="POST",
+        )
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                resp.read()
+        except OSError as e:   # URLError / HTTPError / timeouts
+            raise DeliveryError(str(e)) from e
+
+
+TRANSPORTS = {
+    "file": FileTransport,
+    "http": HttpTransport,
+}
+
+transport = TRANSPORTS[OUTBOX_TRANSPORT]() if OUTBOX_TRANSPORT else None
+
+
+# =================================================
+# DELIVERY
+# =================================================
+def retry_at(attempts, now):
+    delay = min(RETRY_BACKOFF * (2 ** (attempts - 1)), RETRY_BACKOFF_MAX)
+    return (now + delay).isoformat(timespec="seconds")
+
+
+def claim(conn, limit=OUTBOX_BATCH):
+    """
+    Lease up to `limit` due messages to this sender. Rows left in
+    'sending' by a process that died are due again once the lease
+    has run out.
+    """
+    now = datetime.now()
+
+    def work(conn):
+        return conn.execute("""
+            UPDATE outbox
+            SET status = 'sending',
+                attempts = attempts + 1,
+                next_attempt_at = ?
+            WHERE id IN (
+                SELECT id FROM outbox
+                WHERE status IN ('pending', 'sending')
+                  AND next_attempt_at <= ?
+                ORDER BY next_attempt_at
+                LIMIT ?
+            )
+            RETURNING id, idempotency_key, kind, recipient, body, attempts
+        """, (
+            (now + SEND_LEASE).isoformat(timespec="seconds"),
+            now.isoformat(timespec="seconds"),
+            limit
+        )).fetchall()
+
+    return immediate(conn, work)
+
+
+def _send(sender, row):
+    message = {k: row[k] for k in ("id", "idempotency_key", "kind", "recipient", "body")}
+    try:
+        sender.send(message)
+        return None
+    except Exception as e:
+        return str(e) or e.__class__.__name__
+
+
+def deliver_batch(conn, sender=None, batch_size=OUTBOX_BATCH,
+                  concurrency=OUTBOX_CONCURRENCY):
+    """
+    Claim one batch, send it through `sender` (default: the
+    configured transport) with at most `concurrency` messages in
+    flight, then record every outcome in a single transaction.
+    Failures are retried with exponential backoff; after
+    MAX_ATTEMPTS a message is marked dead.
+    Returns {"claimed", "sent", "retried", "dead"}.
+    """
+    sender = sender or transport
+    if sender is None:
+        raise DeliveryError("MEDBUDDY_OUTBOX_TRANSPORT is not set")
+    rows = claim(conn, batch_size)
+    result = {"claimed": len(rows), "sent": 0, "retried": 0, "dead": 0}
+    if not rows:
+        return result
+
+    with ThreadPoolExecutor(max_workers=concurrency) as ex:
+        errors = list(ex.map(lambda r: _send(sender, r), rows))
+
+    now = datetime.now()
+    sent, retry, dead = [], [], []
+    for row, error in zip(rows, errors):
+        if error is None:
+            sent.append((now.isoformat(timespec="seconds"), row["id"]))
+        elif row["attempts"] >= MAX_ATTEMPTS:
+            dead.append((error, row["id"]))
+        else:
+            retry.append((retry_at(row["attempts"], now), error, row["id"]))
+
+    def work(conn):
+        conn.executemany("""
+            UPDATE outbox SET status='sent', sent_at=?, last_error=NULL
+            WHERE id=?
+        """, sent)
+        conn.executemany("""
+            UPDATE outbox SET status='pending', next_attempt_at=?, last_error=?
+            WHERE id=?
+        """, retry)
+        conn.executemany("""
+            UPDATE outbox SET status='dead', last_error=?
+            WHERE id=?
+        """, dead)
+
+    immediate(conn, work)
+
+    result.update(sent=len(sent), retried=len(retry), dead=len(dead))
+    return result
+
+
+def outbox_stats(conn):
+    """Message count per status."""
+    rows = conn.execute(
+        "SELECT status, COUNT(*) AS n FROM outbox GROUP BY status"
+    ).fetchall()
+    counts = dict.fromkeys((PENDING, SENDING, SENT, DEAD), 0)
+    counts.update((r["status"], r["n"]) for r in rows)
+    return counts
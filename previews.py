@@ -0,0 +1,125 @@
+import os
+import shutil
+import subprocess
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:          # Pillow ships with reportlab, but stay optional
+    Image = None
+
+try:
+    import fitz              # PyMuPDF, optional: first-page PDF previews
+except ImportError:
+    fitz = None
+
+PREVIEW_SIZE = (320, 320)
+PREVIEW_BATCH = 20
+
+IMAGE_EXTENSIONS = {"png", "jpg", "jpeg"}
+
+# medical_reports.preview_status
+PENDING = "pending"
+READY = "ready"
+UNSUPPORTED = "unsupported"
+FAILED = "failed"
+
+
+def preview_path(file_path):
+    """
+    Thumbnail lives next to the content: <name>.<ext>.thumb.jpg. The
+    extension stays in, or legacy report.pdf and report.jpg would share
+    one thumbnail.
+    """
+    return file_path + ".thumb.jpg"
+
+
+def _save_thumbnail(im, dest):
+    im = ImageOps.exif_transpose(im)
+    im.thumbnail(PREVIEW_SIZE)
+    tmp = dest + f".{os.getpid()}.tmp"
+    im.convert("RGB").save(tmp, "JPEG", quality=80, optimize=True)
+    os.replace(tmp, dest)
+
+
+def _image_preview(src, dest):
+    with Image.open(src) as im:
+        im.draft("RGB", PREVIEW_SIZE)   # JPEG: decode at reduced scale
+        _save_thumbnail(im, dest)
+
+
+def _pdf_preview(src, dest):
+    if fitz is not None:
+        with fitz.open(src) as doc:
+            pix = doc[0].get_pixmap(matrix=fitz.Matrix(0.5, 0.5))
+            im = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+            _save_thumbnail(im, dest)
+        return True
+
+    pdftoppm = shutil.which("pdftoppm")
+    if pdftoppm:
+        prefix = dest + f".{os.getpid()}"
+        subprocess.run(
+            [pdftoppm, "-jpeg", "-f", "1", "-l", "1", "-singlefile",
+             "-scale-to", str(max(PREVIEW_SIZE)), src, prefix],
+            check=True, timeout=30,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        os.replace(prefix + ".jpg", dest)
+        return True
+
+    return False
+
+
+def build_preview(file_path):
+    """
+    Write the thumbnail for one stored report.
+    Returns (status, preview_path or None).
+    """
+    ext = file_path.rsplit(".", 1)[-1].lower()
+    dest = preview_path(file_path)
+
+    if os.path.exists(dest):
+        # content-addressed: the same scan was previewed already
+        return READY, dest
+
+    if Image is None:
+        return UNSUPPORTED, None
+
+    if ext in IMAGE_EXTENSIONS:
+        _image_preview(file_path, dest)
+        return READY, dest
+
+    if ext == "pdf" and _pdf_preview(file_path, dest):
+        return READY, dest
+
+    return UNSUPPORTED, None
+
+
+def generate_previews(conn, batch_size=PREVIEW_BATCH):
+    """
+    Process up to `batch_size` pending reports; returns how many
+    were handled. Rendering happens outside any transaction.
+    """
+    rows = conn.execute("""
+        SELECT id, file_path
+        FROM medical_reports
+        WHERE preview_status = 'pending'
+        ORDER BY id
+        LIMIT ?
+    """, (batch_size,)).fetchall()
+
+    for r in rows:
+        try:
+            status, path = build_preview(r["file_path"])
+        except Exception as e:
+            print(f"🖼 Preview failed for report {r['id']}: {e}")
+            status, path = FAILED, None
+
+        conn.execute("""
+            UPDATE medical_reports
+            SET preview_status=?, preview_path=?
+            WHERE id=?
+        """, (status, path, r["id"]))
+        conn.commit()
+
+    return len(rows)
@@ -0,0 +1,472 @@
+import glob
+import hashlib
+import io
+import json
+import math
+import multiprocessing
+import os
+import threading
+import time
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import A4
+
+from metrics import pdf_render_duration, pdf_queue_duration, pdf_rejected
+
+# Everything drawn on a receipt. The cache key hashes these, so a
+# change to any of them produces a new entry instead of a stale PDF.
+RECEIPT_FIELDS = (
+    "confirmation_code", "patient_name", "mobile",
+    "appointment_date", "slot_time", "consultation_type",
+    "status", "amount", "doctor_whatsapp",
+)
+
+# "memory" (LRU), "disk" or "off"
+RECEIPT_CACHE = os.environ.get("MEDBUDDY_RECEIPT_CACHE", "memory")
+RECEIPT_CACHE_DIR = os.environ.get("MEDBUDDY_RECEIPT_CACHE_DIR", "receipt_cache")
+RECEIPT_CACHE_ENTRIES = int(os.environ.get("MEDBUDDY_RECEIPT_CACHE_ENTRIES", "512"))
+
+# receipt downloads render in worker processes; 0 renders inline
+PDF_WORKERS = int(os.environ.get("MEDBUDDY_PDF_WORKERS", "2"))
+# renders waiting or running before downloads get 503 + Retry-After
+PDF_QUEUE = int(os.environ.get("MEDBUDDY_PDF_QUEUE", "16"))
+PDF_TIMEOUT = 30           # seconds
+
+EXPORT_WORKERS = int(os.environ.get("MEDBUDDY_EXPORT_WORKERS", "2"))
+EXPORT_LIMIT = 500
+
+FONTS = ("Helvetica", "Helvetica-Bold", "Helvetica-Oblique")
+
+
+# =================================================
+# RENDERING
+# =================================================
+def receipt_fields(a):
+    return {k: a[k] for k in RECEIPT_FIELDS}
+
+
+def _draw_receipt(pdf, a):
+    width, height = A4
+
+    y = height - 50
+
+    # ================= HEADER =================
+    pdf.setFont("Helvetica-Bold", 18)
+    pdf.drawCentredString(width / 2, y, "Harmony HomeoCare")
+    y -= 25
+
+    pdf.setFont("Helvetica", 11)
+    pdf.drawCentredString(
+        width / 2, y,
+        "Online Homeopathy Consultation"
+    )
+    y -= 15
+
+    pdf.setFont("Helvetica", 10)
+    pdf.drawCentredString(
+        width / 2, y,
+        f"WhatsApp: +{a['doctor_whatsapp']}"
+    )
+
+    # Divider
+    y -= 25
+    pdf.line(40, y, width - 40, y)
+    y -= 30
+
+    # ================= TITLE =================
+    pdf.setFont("Helvetica-Bold", 14)
+    pdf.drawCentredString(width / 2, y, "CONSULTATION RECEIPT")
+    y -= 30
+
+    # ================= DETAILS =================
+    pdf.setFont("Helvetica", 11)
+
+    def row(label, value):
+        nonlocal y
+        pdf.drawString(60, y, f"{label}:")
+        pdf.drawString(220, y, str(value))
+        y -= 22
+
+    row("Receipt No", a["confirmation_code"])
+    row("Patient Name", a["patient_name"])
+    row("Mobile Number", a["mobile"])
+    row("Appointment Date", a["appointment_date"])
+    row("Time Slot", a["slot_time"])
+    row("Consultation Type", (a["consultation_type"] or "FIRST").title())
+    row("Status", a["status"])
+    row("Amount Paid", f"₹ {a['amount']}")
+
+    # ================= NOTES =================
+    y -= 10
+    pdf.line(60, y, width - 60, y)
+    y -= 25
+
+    pdf.setFont("Helvetica-Oblique", 10)
+    pdf.drawString(
+        60, y,
+        "Note: This is a computer-generated receipt and does not require a signature."
+    )
+
+    pdf.showPage()
+
+
+def render_receipt(a):
+    """PDF bytes for one receipt. `a` needs the RECEIPT_FIELDS keys."""
+    buf = io.BytesIO()
+    pdf = canvas.Canvas(buf, pagesize=A4)
+    _draw_receipt(pdf, a)
+    pdf.save()
+    return buf.getvalue()
+
+
+def render_receipt_book(rows):
+    """One PDF with a page per receipt."""
+    buf = io.BytesIO()
+    pdf = canvas.Canvas(buf, pagesize=A4)
+    for a in rows:
+        _draw_receipt(pdf, a)
+    pdf.save()
+    return buf.getvalue()
+
+
+def warm_up():
+    """
+    Worker initializer: load the font metrics and run one throwaway
+    render, so the first real receipt doesn't pay for them.
+    """
+    for name in FONTS:
+        pdfmetrics.getFont(name)
+    render_receipt(dict.fromkeys(RECEIPT_FIELDS, ""))
+
+
+def _timed(fn, *args):
+    started = time.perf_counter()
+    data = fn(*args)
+    return data, time.perf_counter() - started
+
+
+# =================================================
+# RENDER POOLS
+# =================================================
+class RenderBusy(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"PDF render queue full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+def _mp_context():
+    ctx = multiprocessing.get_context("forkserver")
+    ctx.set_forkserver_preload(["receipts"])    # ReportLab loaded once, in the server
+    return ctx
+
+
+class RenderPool:
+    """
+    ReportLab is pure Python: rendered on a request thread it holds
+    the GIL every other request needs. Here it runs in `workers`
+    warmed-up processes. With `max_queue` set, at most that many
+    renders wait or run at once; more raise RenderBusy instead of
+    queueing without bound.
+    """
+
+    def __init__(self, name, workers, max_queue=None, timeout=PDF_TIMEOUT):
+        self.name = name
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._executor = None
+        self._mean = 0.05       # running average render time, seconds
+        self.in_flight = 0
+        self.rendered = 0
+        self.rejected = 0
+
+    def _pool(self, broken=None):
+        with self._lock:
+            if self._executor is None or self._executor is broken:
+                # workers come from a single-threaded fork server, never
+                # from this process: it runs request and job threads, and
+                # the executor adds workers (or is rebuilt) at any time
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, initializer=warm_up,
+                    mp_context=_mp_context(),
+                )
+            return self._executor
+
+    def start(self):
+        """Spawn and warm every worker now instead of on first use."""
+        if self.workers:
+            pool = self._pool()
+            for f in [pool.submit(time.sleep, 0.1) for _ in range(self.workers)]:
+                f.result()
+
+    def _retry_after(self):
+        return max(1, math.ceil(self.in_flight * self._mean / max(self.workers, 1)))
+
+    def _submit(self, fn, *args):
+        with self._lock:
+            if self.max_queue is not None and self.in_flight >= self.max_queue:
+                self.rejected += 1
+                pdf_rejected.inc(self.name)
+                raise RenderBusy(self._retry_after())
+            self.in_flight += 1
+
+        queued = time.perf_counter()
+        pool = self._pool()
+        try:
+            try:
+                future = pool.submit(_timed, fn, *args)
+            except BrokenProcessPool:
+                # a worker died (OOM, kill); start a fresh pool once
+                future = self._pool(broken=pool).submit(_timed, fn, *args)
+        except Exception:
+            with self._lock:
+                self.in_flight -= 1
+            raise
+
+        future.add_done_callback(partial(self._done, queued))
+        return future
+
+    def _done(self, queued, future):
+        seconds = None
+        if not future.cancelled() and future.exception() is None:
+            seconds = future.result()[1]
+        with self._lock:
+            self.in_flight -= 1
+            if seconds is not None:
+                self.rendered += 1
+                self._mean += (seconds - self._mean) * 0.2
+        if seconds is not None:
+            pdf_render_duration.observe(seconds, self.name)
+            pdf_queue_duration.observe(time.perf_counter() - queued - seconds, self.name)
+
+    def render(self, fn, *args):
+        """fn(*args) in a worker; raises RenderBusy when saturated."""
+        if not self.workers:
+            data, seconds = _timed(fn, *args)
+            pdf_render_duration.observe(seconds, self.name)
+            return data
+        try:
+            return self._submit(fn, *args).result(self.timeout)[0]
+        except TimeoutError:
+            # still queued behind slower renders: same answer as a full queue
+            raise RenderBusy(self._retry_after())
+
+    def render_all(self, fn, items):
+        """[fn(item) ...] spread over the workers, in order."""
+        if not self.workers:
+            return [self.render(fn, a) for a in items]
+        futures = [self._submit(fn, a) for a in items]
+        return [f.result()[0] for f in futures]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "in_flight": self.in_flight,
+                "max_queue": self.max_queue or 0,
+                "rendered": self.rendered,
+                "rejected": self.rejected,
+                "mean_render_seconds": round(self._mean, 4),
+            }
+
+
+receipt_renderer = RenderPool("receipt", PDF_WORKERS, max_queue=PDF_QUEUE)
+# admin exports are few and may be large: no queue limit or timeout
+export_renderer = RenderPool("export", EXPORT_WORKERS, timeout=None)
+
+
+# =================================================
+# CACHE
+# =================================================
+def receipt_key(a):
+    digest = hashlib.sha256(
+        json.dumps(receipt_fields(a), sort_keys=True, default=str).encode()
+    ).hexdigest()[:16]
+    return f"{a['confirmation_code']}-{digest}"
+
+
+class MemoryReceiptStore:
+    """LRU of rendered receipts, bounded by entry count."""
+
+    def __init__(self, max_entries=RECEIPT_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        with self._lock:
+            self._items[key] = data
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def invalidate(self, code):
+        prefix = f"{code}-"
+        with self._lock:
+            for key in [k for k in self._items if k.startswith(prefix)]:
+                del self._items[key]
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+class DiskReceiptStore:
+    """
+    Receipts as files in one directory, shared by every worker
+    process. Least recently read files are evicted first.
+    """
+
+    def __init__(self, directory=RECEIPT_CACHE_DIR, max_entries=RECEIPT_CACHE_ENTRIES):
+        self.directory = directory
+        self.max_entries = max_entries
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.pdf")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as fh:
+                data = fh.read()
+        except FileNotFoundError:
+            return None
+        os.utime(path)
+        return data
+
+    def put(self, key, data):
+        tmp = self._path(key) + f".{os.getpid()}.tmp"
+        with open(tmp, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, self._path(key))
+        self._evict()
+
+    def _evict(self):
+        files = glob.glob(os.path.join(self.directory, "*.pdf"))
+        if len(files) <= self.max_entries:
+            return
+        files.sort(key=lambda p: os.stat(p).st_mtime)
+        for path in files[:len(files) - self.max_entries]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def invalidate(self, code):
+        for path in glob.glob(os.path.join(self.directory, f"{glob.escape(code)}-*.pdf")):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        for path in glob.glob(os.path.join(self.directory, "*.pdf")):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class ReceiptCache:
+
+    def __init__(self, store=None):
+        self.store = store
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, a):
+        """
+        Cached PDF bytes for this appointment, rendering on a miss
+        (in receipt_renderer; may raise RenderBusy).
+        """
+        if self.store is None:
+            return receipt_renderer.render(render_receipt, receipt_fields(a))
+
+        key = receipt_key(a)
+        data = self.store.get(key)
+        with self._lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        if data is None:
+            data = receipt_renderer.render(render_receipt, receipt_fields(a))
+            self.store.put(key, data)
+        return data
+
+    def invalidate(self, code):
+        if self.store is not None:
+            self.store.invalidate(code)
+
+    def clear(self):
+        if self.store is not None:
+            self.store.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+def _make_store():
+    if RECEIPT_CACHE == "disk":
+        return DiskReceiptStore()
+    if RECEIPT_CACHE == "memory":
+        return MemoryReceiptStore()
+    return None
+
+
+receipt_cache = ReceiptCache(_make_store())
+
+
+# =================================================
+# BULK EXPORT
+# =================================================
+def export_receipts(rows, fmt="zip"):
+    """
+    Bytes of a ZIP (one PDF per receipt) or a single multi-page PDF.
+    ZIP members come from the receipt cache where possible; the
+    rest are rendered in parallel in the export worker processes.
+    """
+    rows = [receipt_fields(a) for a in rows]
+
+    if fmt == "pdf":
+        # one canvas, so one worker; still keeps ReportLab off the request thread
+        return export_renderer.render(render_receipt_book, rows)
+
+    pdfs = {}
+    missing = []
+    for a in rows:
+        data = receipt_cache.store.get(receipt_key(a)) if receipt_cache.store else None
+        if data is None:
+            missing.append(a)
+        else:
+            pdfs[a["confirmation_code"]] = data
+
+    if missing:
+        for a, data in zip(missing, export_renderer.render_all(render_receipt, missing)):
+            pdfs[a["confirmation_code"]] = data
+            if receipt_cache.store is not None:
+                receipt_cache.store.put(receipt_key(a), data)
+
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for a in rows:
+            zf.writestr(f"{a['confirmation_code']}.pdf", pdfs[a["confirmation_code"]])
+    return buf.getvalue()
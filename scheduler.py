@@ -1,86 +1,486 @@
-import sqlite3
+import atexit
+import heapq
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import uuid
 from datetime import datetime, timedelta
 
-DB = "medbuddy.db"
+from apscheduler.schedulers.background import BackgroundScheduler
 
-def auto_expire_reserved():
+from archive import archive_history
+from availability import slots_freed
+from database import pool, immediate
+from messages import render_text, reminder_values
+from metrics import timed_job
+from outbox import enqueue, deliver_batch, transport, OUTBOX_BATCH
+from previews import generate_previews
+from settings import settings_cache
+
+EXPIRE_AFTER = timedelta(hours=2)
+EXPIRE_BATCH_SIZE = 500
+
+@timed_job
+def auto_expire_reserved(batch_size=EXPIRE_BATCH_SIZE):
     """
     Auto-cancel RESERVED appointments older than 2 hours
     and free their slots.
-    """
-    conn = sqlite3.connect(DB)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
 
+    Works in set-based batches of at most `batch_size` rows, each in
+    its own short IMMEDIATE transaction, so the write lock is released
+    between batches and bookings are never held up for long.
+    Returns counts for instrumentation.
+    """
     now = datetime.now()
-    expiry_time = now - timedelta(hours=2)
+    cutoff = (now - EXPIRE_AFTER).isoformat()
+    result = {"expired": 0, "slots_freed": 0, "batches": 0}
 
-    rows = c.execute("""
-        SELECT id, slot_id, created_at
-        FROM appointments
-        WHERE status = 'RESERVED'
-    """).fetchall()
+    def batch(conn):
+        # Cancel appointments
+        rows = conn.execute("""
+            UPDATE appointments
+            SET status = 'CANCELLED', updated_at = ?
+            WHERE id IN (
+                SELECT id FROM appointments
+                WHERE status = 'RESERVED'
+                  AND created_at < ?
+                ORDER BY created_at
+                LIMIT ?
+            )
+            RETURNING slot_id
+        """, (now.isoformat(), cutoff, batch_size)).fetchall()
+        slot_ids = [r["slot_id"] for r in rows]
 
-    for r in rows:
-        created = datetime.fromisoformat(r["created_at"])
-        if created < expiry_time:
-            # Cancel appointment
-            c.execute("""
-                UPDATE appointments
-                SET status = 'CANCELLED'
-                WHERE id = ?
-            """, (r["id"],))
+        # Free their slots
+        freed = 0
+        if slot_ids:
+            marks = ",".join("?" * len(slot_ids))
+            freed = conn.execute(
+                f"UPDATE slots SET is_booked = 0 WHERE id IN ({marks})",
+                slot_ids
+            ).rowcount
+        return slot_ids, freed
 
-            # Free slot
-            c.execute("""
-                UPDATE slots
-                SET is_booked = 0
-                WHERE id = ?
-            """, (r["slot_id"],))
+    with pool.connection() as conn:
+        while True:
+            slot_ids, freed = immediate(conn, batch)
+            if slot_ids:
+                slots_freed(conn, *slot_ids)
 
-            print(f"⏳ Auto-expired appointment ID {r['id']}")
+            result["expired"] += len(slot_ids)
+            result["slots_freed"] += freed
+            result["batches"] += 1
 
-    conn.commit()
-    conn.close()
+            if len(slot_ids) < batch_size:
+                break
 
+    if result["expired"]:
+        print(f"⏳ Auto-expired {result['expired']} appointment(s)")
 
-def send_reminders():
+    return result
+
+
+@timed_job
+def build_report_previews():
     """
-    Mark reminder_sent = 1 for CONFIRMED appointments
-    30 minutes before start time (safe Phase-1).
+    Thumbnails / first-page previews for newly uploaded
+    medical reports. Returns the number processed.
     """
-    conn = sqlite3.connect(DB)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
+    with pool.connection() as conn:
+        done = generate_previews(conn)
 
-    now = datetime.now()
+    if done:
+        print(f"🖼 Built {done} report preview(s)")
+    return done
+
+
+REMINDER_LEAD = timedelta(minutes=30)
+
+
+@timed_job
+def send_reminders(now=None):
+    """
+    Queue the reminder message for CONFIRMED appointments
+    30 minutes before start time and set reminder_sent = 1.
+
+    Selects only the due window through the starts_at index; the
+    flag and the outbox rows are written in one transaction, and
+    delivery happens later in deliver_outbox.
+    Returns the number of reminders queued.
+    """
+    now = now or datetime.now()
+    window = (
+        now.isoformat(timespec="seconds"),
+        (now + REMINDER_LEAD).isoformat(timespec="seconds"),
+    )
+
+    def work(conn):
+        rows = conn.execute("""
+            SELECT id, confirmation_code, patient_name, mobile,
+                   appointment_date, slot_time
+            FROM appointments
+            WHERE status = 'CONFIRMED'
+              AND reminder_sent = 0
+              AND starts_at BETWEEN ? AND ?
+        """, window).fetchall()
+
+        if not rows:
+            return rows
+
+        template = settings_cache.get(conn).reminder_message
+
+        for r in rows:
+            enqueue(
+                conn,
+                f"reminder:{r['confirmation_code']}",
+                "reminder",
+                r["mobile"],
+                render_text(template, reminder_values(r))
+            )
+
+        ids = [r["id"] for r in rows]
+        marks = ",".join("?" * len(ids))
+        conn.execute(
+            f"UPDATE appointments SET reminder_sent = 1 WHERE id IN ({marks})",
+            ids
+        )
+        return rows
 
-    rows = c.execute("""
-        SELECT id, patient_name, mobile,
-               appointment_date, slot_time
-        FROM appointments
-        WHERE status = 'CONFIRMED'
-          AND reminder_sent = 0
-    """).fetchall()
+    with pool.connection() as conn:
+        rows = immediate(conn, work)
 
     for r in rows:
-        start_time = r["slot_time"].split("-")[0].strip()
-        appt_time = datetime.strptime(
-            f"{r['appointment_date']} {start_time}",
-            "%Y-%m-%d %H:%M"
+        print(
+            f"🔔 Reminder queued for "
+            f"{r['patient_name']} ({r['mobile']})"
         )
 
-        if appt_time - timedelta(minutes=30) <= now <= appt_time:
-            c.execute("""
-                UPDATE appointments
-                SET reminder_sent = 1
-                WHERE id = ?
-            """, (r["id"],))
+    return len(rows)
 
-            print(
-                f"🔔 Reminder triggered for "
-                f"{r['patient_name']} ({r['mobile']})"
+
+@timed_job
+def deliver_outbox(max_batches=20):
+    """
+    Send queued notifications batch by batch until the outbox has
+    nothing due (or `max_batches` were sent, to bound one run).
+    Returns totals over all batches.
+    """
+    totals = {"claimed": 0, "sent": 0, "retried": 0, "dead": 0}
+
+    with pool.connection() as conn:
+        for _ in range(max_batches):
+            result = deliver_batch(conn)
+            for k in totals:
+                totals[k] += result[k]
+            if result["claimed"] < OUTBOX_BATCH:
+                break
+
+    if totals["claimed"]:
+        print(
+            f"📤 Outbox: {totals['sent']} sent, "
+            f"{totals['retried']} to retry, {totals['dead']} dead"
+        )
+    return totals
+
+
+class OutboxWorker:
+    """
+    Delivers the outbox from a background thread. Request handlers
+    call wake() after queueing a message, so it goes out right away;
+    wakes that arrive during a run collapse into one more run.
+    Otherwise it polls every `interval` for due retries and for
+    messages queued by other processes.
+    """
+
+    def __init__(self, interval=timedelta(seconds=30)):
+        self.interval = interval.total_seconds()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def wake(self):
+        self._wake.set()
+
+    def start(self):
+        if transport is None:
+            print("📤 MEDBUDDY_OUTBOX_TRANSPORT is not set: messages stay queued, unsent")
+            return
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="outbox-worker", daemon=True
             )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                deliver_outbox()
+            except Exception as e:
+                print(f"📤 Outbox run failed: {e}")
+
+
+class ReminderTimer:
+    """
+    Alternative to polling send_reminders every 5 minutes.
+
+    Keeps a min-heap of pending start times and sleeps until the
+    earliest one enters the reminder window. Newly confirmed
+    appointments are pushed with schedule(). The heap is reloaded
+    from the database every `resync` so confirmations made by other
+    processes are picked up too; at half the lead, such a reminder
+    still goes out at least lead/2 before the appointment.
+    """
+
+    def __init__(self, lead=REMINDER_LEAD, resync=REMINDER_LEAD / 2):
+        self.lead = lead
+        self.resync = resync
+        self._heap = []
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def load(self):
+        now = datetime.now().isoformat(timespec="seconds")
+        with pool.connection() as conn:
+            rows = conn.execute("""
+                SELECT starts_at FROM appointments
+                WHERE status = 'CONFIRMED'
+                  AND reminder_sent = 0
+                  AND starts_at >= ?
+            """, (now,)).fetchall()
+
+        with self._cond:
+            self._heap = [datetime.fromisoformat(r["starts_at"]) for r in rows]
+            heapq.heapify(self._heap)
+            self._cond.notify()
+
+    def schedule(self, starts_at):
+        with self._cond:
+            heapq.heappush(self._heap, datetime.fromisoformat(starts_at))
+            self._cond.notify()
+
+    def start(self):
+        if self._thread is None:
+            self.load()
+            self._thread = threading.Thread(
+                target=self._run, name="reminder-timer", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        """The running thread exits at its next wake-up."""
+        with self._cond:
+            self._thread = None
+            self._cond.notify()
+
+    def _run(self):
+        next_sync = datetime.now() + self.resync
+        while True:
+            with self._cond:
+                if self._thread is not threading.current_thread():
+                    return
+                now = datetime.now()
+                wake = next_sync
+                if self._heap:
+                    wake = min(wake, self._heap[0] - self.lead)
+
+                if wake > now:
+                    self._cond.wait((wake - now).total_seconds())
+                    continue
+
+                due = False
+                while self._heap and self._heap[0] - self.lead <= now:
+                    heapq.heappop(self._heap)
+                    due = True
+
+            if due:
+                send_reminders()
+
+            if now >= next_sync:
+                self.load()
+                next_sync = now + self.resync
+
+
+# =================================================
+# LEADER ELECTION
+# Every process may start a JobRunner; the one holding the
+# scheduler_lease row runs the jobs, the others stand by.
+# =================================================
+SCHEDULER_LEASE = timedelta(seconds=int(os.environ.get("MEDBUDDY_SCHEDULER_LEASE", "30")))
+
+# MEDBUDDY_REMINDERS=timer wakes exactly when the next reminder
+# is due instead of polling every 5 minutes.
+REMINDER_MODE = os.environ.get("MEDBUDDY_REMINDERS", "poll")
+
+
+class LeaderLease:
+    """
+    A named, expiring lease in the database. The holder renews it
+    well before `lease` runs out; if it stops (crash, hang, shutdown)
+    another process takes the row over once it has expired.
+    """
+
+    def __init__(self, name="jobs", lease=SCHEDULER_LEASE):
+        self.name = name
+        self.lease = lease
+        self._token = uuid.uuid4().hex[:8]
+
+    @property
+    def owner(self):
+        # pid read each time: a forked worker must not inherit the lease
+        return f"{socket.gethostname()}:{os.getpid()}:{self._token}"
+
+    def acquire(self):
+        """Take or renew the lease. True if this process holds it."""
+        now = datetime.now()
+
+        def work(conn):
+            return conn.execute("""
+                INSERT INTO scheduler_lease (name, owner, expires_at)
+                VALUES (?, ?, ?)
+                ON CONFLICT(name) DO UPDATE
+                SET owner = excluded.owner, expires_at = excluded.expires_at
+                WHERE scheduler_lease.owner = excluded.owner
+                   OR scheduler_lease.expires_at < ?
+                RETURNING owner
+            """, (
+                self.name, self.owner,
+                (now + self.lease).isoformat(timespec="seconds"),
+                now.isoformat(timespec="seconds"),
+            )).fetchone()
+
+        with pool.connection() as conn:
+            return immediate(conn, work) is not None
+
+    def release(self):
+        with pool.connection() as conn:
+            immediate(conn, lambda c: c.execute(
+                "DELETE FROM scheduler_lease WHERE name=? AND owner=?",
+                (self.name, self.owner)
+            ))
+
+
+class JobRunner:
+    """
+    The periodic jobs, run only while this process holds the lease.
+    A heartbeat thread renews it every lease/3; on losing it the jobs
+    are paused until the lease is won again.
+    """
+
+    def __init__(self, lease=None, reminder_mode=REMINDER_MODE):
+        self.lease = lease or LeaderLease()
+        self.reminder_mode = reminder_mode
+        self.reminder_timer = ReminderTimer()
+        self.leader = False
+        self.takeovers = 0
+
+        self.scheduler = BackgroundScheduler()
+        self.scheduler.add_job(auto_expire_reserved, "interval", minutes=10)
+        self.scheduler.add_job(build_report_previews, "interval", minutes=1, id="report_previews")
+        if reminder_mode != "timer":
+            self.scheduler.add_job(send_reminders, "interval", minutes=5)
+        # nightly, outside clinic hours: the first run also VACUUMs
+        self.scheduler.add_job(archive_history, "cron", hour=3, minute=30)
+
+        self._held_until = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self.scheduler.start(paused=True)
+            self._thread = threading.Thread(
+                target=self._run, name="job-leader", daemon=True
+            )
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def stop(self):
+        """Give the lease up so a standby takes over right away."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def run_soon(self, job_id):
+        """Run a job now rather than on its next interval (leader only)."""
+        if self.leader:
+            self.scheduler.get_job(job_id).modify(next_run_time=datetime.now())
+
+    def schedule_reminder(self, starts_at):
+        if self.leader and self.reminder_mode == "timer":
+            self.reminder_timer.schedule(starts_at)
+
+    def _run(self):
+        renew = self.lease.lease.total_seconds() / 3
+        while not self._stop.is_set():
+            try:
+                leader = self.lease.acquire()
+                if leader:
+                    self._held_until = time.monotonic() + self.lease.lease.total_seconds()
+            except Exception as e:
+                # keep running until the lease we hold would have expired
+                print(f"👑 Scheduler lease renewal failed: {e}")
+                leader = self.leader and time.monotonic() < self._held_until
+
+            if leader != self.leader:
+                self._switch(leader)
+            self._stop.wait(renew)
+
+        if self.leader:
+            self._switch(False)
+            try:
+                self.lease.release()
+            except Exception as e:
+                print(f"👑 Scheduler lease release failed: {e}")
+
+    def _switch(self, leader):
+        self.leader = leader
+        if leader:
+            self.takeovers += 1
+            print(f"👑 {self.lease.owner} now runs the scheduled jobs")
+            self.scheduler.resume()
+            if self.reminder_mode == "timer":
+                self.reminder_timer.start()
+        else:
+            print(f"👑 {self.lease.owner} stopped running the scheduled jobs")
+            self.scheduler.pause()
+            self.reminder_timer.stop()
+
+    def stats(self):
+        return {"leader": int(self.leader), "takeovers": self.takeovers}
+
+
+# =================================================
+# STANDALONE
+#   MEDBUDDY_SCHEDULER=off python app.py / gunicorn app:app (web only)
+#   python scheduler.py                                     (jobs only)
+# =================================================
+def main():
+    from init_db import migrate
+
+    with pool.connection() as conn:
+        migrate(conn)
+
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    runner = JobRunner()
+    runner.start()
+    # web workers wake their own outbox worker; this one picks up
+    # retries and anything queued while they were down
+    OutboxWorker().start()
+
+    print(f"⏰ Scheduler running (lease '{runner.lease.name}', reminders: {runner.reminder_mode})")
+    try:
+        while True:
+            time.sleep(3600)
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        runner.stop()
+
 
-    conn.commit()
-    conn.close()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+import re
+from datetime import date, datetime, timedelta
+
+MAX_SCHEDULE_DAYS = 92        # one quarter per request
+MAX_SCHEDULE_SLOTS = 5000
+MIN_SLOT_MINUTES = 5
+
+WEEKDAY_NAMES = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+
+
+class ScheduleError(ValueError):
+    pass
+
+
+# =================================================
+# PARSING
+# =================================================
+def _time(value, field):
+    try:
+        return datetime.strptime(value.strip(), "%H:%M")
+    except (AttributeError, ValueError):
+        raise ScheduleError(f"{field}: expected HH:MM, got {value!r}")
+
+
+def _date(value, field):
+    try:
+        return date.fromisoformat(str(value).strip())
+    except ValueError:
+        raise ScheduleError(f"{field}: expected YYYY-MM-DD, got {value!r}")
+
+
+def _items(value):
+    """A list as-is, or a comma / whitespace separated string."""
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(v).strip() for v in value if str(v).strip()]
+    return [v for v in re.split(r"[,\s]+", value) if v]
+
+
+def _weekday(value):
+    value = str(value).strip().lower()
+    if value.isdigit() and int(value) < 7:
+        return int(value)
+    if value[:3] in WEEKDAY_NAMES:
+        return WEEKDAY_NAMES.index(value[:3])
+    raise ScheduleError(f"weekdays: unknown day {value!r}")
+
+
+def parse_schedule(data):
+    """
+    Validate a recurring schedule from a form (MultiDict) or JSON
+    dict:
+
+        start_date, end_date      YYYY-MM-DD, inclusive
+        weekdays                  0-6 or mon..sun (default mon-sat)
+        window_start, window_end  HH:MM
+        slot_minutes              slot length
+        breaks                    "13:00-14:00, ..." (optional)
+        holidays                  "2026-01-26, ..." (optional)
+    """
+    def get_list(key):
+        if hasattr(data, "getlist") and len(data.getlist(key)) > 1:
+            return data.getlist(key)
+        return data.get(key)
+
+    start = _date(data.get("start_date") or date.today().isoformat(), "start_date")
+    end = _date(data.get("end_date") or start.isoformat(), "end_date")
+    if end < start:
+        raise ScheduleError("end_date is before start_date")
+    if (end - start).days >= MAX_SCHEDULE_DAYS:
+        raise ScheduleError(f"at most {MAX_SCHEDULE_DAYS} days per schedule")
+
+    weekdays = {_weekday(v) for v in _items(get_list("weekdays"))} or set(range(6))
+
+    window_start = _time(data.get("window_start"), "window_start")
+    window_end = _time(data.get("window_end"), "window_end")
+    if window_end <= window_start:
+        raise ScheduleError("window_end must be after window_start")
+
+    try:
+        minutes = int(data.get("slot_minutes") or 0)
+    except (TypeError, ValueError):
+        raise ScheduleError("slot_minutes must be a whole number")
+    if minutes < MIN_SLOT_MINUTES:
+        raise ScheduleError(f"slot_minutes must be at least {MIN_SLOT_MINUTES}")
+    if timedelta(minutes=minutes) > window_end - window_start:
+        raise ScheduleError("slot_minutes is longer than the window")
+
+    breaks = []
+    for item in _items(get_list("breaks")):
+        b_start, sep, b_end = item.partition("-")
+        if not sep:
+            raise ScheduleError(f"breaks: expected HH:MM-HH:MM, got {item!r}")
+        b_start, b_end = _time(b_start, "breaks"), _time(b_end, "breaks")
+        if b_end <= b_start:
+            raise ScheduleError(f"breaks: {item!r} ends before it starts")
+        breaks.append((b_start, b_end))
+
+    holidays = {_date(v, "holidays") for v in _items(get_list("holidays"))}
+
+    return {
+        "start_date": start,
+        "end_date": end,
+        "weekdays": weekdays,
+        "window": (window_start, window_end),
+        "slot": timedelta(minutes=minutes),
+        "breaks": sorted(breaks),
+        "holidays": holidays,
+    }
+
+
+# =================================================
+# EXPANSION
+# =================================================
+def day_times(schedule):
+    """(start, end) HH:MM pairs for one working day."""
+    if schedule["slot"] <= timedelta(0):
+        return []     # a rule saved before lengths were validated
+    window_start, window_end = schedule["window"]
+    times = []
+    t = window_start
+    while t + schedule["slot"] <= window_end:
+        end = t + schedule["slot"]
+        clash = next((b for b in schedule["breaks"] if t < b[1] and b[0] < end), None)
+        if clash:
+            t = clash[1]      # resume after the break
+            continue
+        times.append((t.strftime("%H:%M"), end.strftime("%H:%M")))
+        t = end
+    return times
+
+
+def expand(schedule, today=None):
+    """Every (slot_date, start_time, end_time) the schedule describes."""
+    today = today or date.today()
+    times = day_times(schedule)
+    slots = []
+    d = max(schedule["start_date"], today)    # never create past slots
+    while d <= schedule["end_date"]:
+        if d.weekday() in schedule["weekdays"] and d not in schedule["holidays"]:
+            day = d.isoformat()
+            slots.extend((day, s, e) for s, e in times)
+        d += timedelta(days=1)
+
+    if len(slots) > MAX_SCHEDULE_SLOTS:
+        raise ScheduleError(f"schedule expands to {len(slots)} slots (max {MAX_SCHEDULE_SLOTS})")
+    return slots
+
+
+def split_overlaps(conn, slots):
+    """
+    (new, overlapping) against what is already offered: stored slots
+    and the slots of saved rules. Overlapping entries carry the id of
+    the slot they collide with.
+    """
+    if not slots:
+        return [], []
+
+    offered = {}
+    for s in slots_between(conn, slots[0][0], slots[-1][0], include_booked=True):
+        offered.setdefault(s["slot_date"], []).append(s)
+
+    new, overlapping = [], []
+    for day, start, end in slots:
+        # HH:MM strings order like times
+        clash = next(
+            (x for x in offered.get(day, ()) if x["start_time"] < end and start < x["end_time"]),
+            None
+        )
+        if clash:
+            overlapping.append({
+                "slot_date": day, "start_time": start, "end_time": end,
+                "existing_id": clash["id"],
+                "existing": f"{clash['start_time']}-{clash['end_time']}",
+            })
+        else:
+            new.append((day, start, end))
+    return new, overlapping
+
+
+def preview_schedule(conn, schedule):
+    new, overlapping = split_overlaps(conn, expand(schedule))
+    return {
+        "count": len(new),
+        "slots": [{"slot_date": d, "start_time": s, "end_time": e} for d, s, e in new],
+        "overlaps": overlapping,
+    }
+
+
+# =================================================
+# RULES
+# A schedule is stored as one slot_rules row; its slots are
+# computed on read and only become rows in `slots` when booked.
+# =================================================
+def save_rule(conn, schedule):
+    """Store a parsed schedule (no commit). Returns the rule id."""
+    return conn.execute("""
+        INSERT INTO slot_rules (
+            start_date, end_date, weekdays,
+            window_start, window_end, slot_minutes,
+            breaks, holidays, created_at
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (
+        schedule["start_date"].isoformat(),
+        schedule["end_date"].isoformat(),
+        sum(1 << d for d in schedule["weekdays"]),
+        schedule["window"][0].strftime("%H:%M"),
+        schedule["window"][1].strftime("%H:%M"),
+        int(schedule["slot"].total_seconds() // 60),
+        ",".join(f"{b:%H:%M}-{e:%H:%M}" for b, e in schedule["breaks"]),
+        ",".join(sorted(d.isoformat() for d in schedule["holidays"])),
+        datetime.now().isoformat(),
+    )).lastrowid
+
+
+def rule_schedule(row):
+    """slot_rules row -> the dict parse_schedule returns."""
+    return {
+        "start_date": date.fromisoformat(row["start_date"]),
+        "end_date": date.fromisoformat(row["end_date"]),
+        "weekdays": {d for d in range(7) if row["weekdays"] >> d & 1},
+        "window": (_time(row["window_start"], "window_start"),
+                   _time(row["window_end"], "window_end")),
+        "slot": timedelta(minutes=row["slot_minutes"]),
+        "breaks": sorted(
+            (_time(b, "breaks"), _time(e, "breaks"))
+            for b, _, e in (x.partition("-") for x in _items(row["breaks"]))
+        ),
+        "holidays": {date.fromisoformat(d) for d in _items(row["holidays"])},
+    }
+
+
+def active_rules(conn, today=None):
+    """Rules that still offer slots from `today` on, oldest first."""
+    rows = conn.execute("""
+        SELECT * FROM slot_rules
+        WHERE end_date >= ?
+    """, ((today or date.today()).isoformat(),)).fetchall()
+    return sorted(rows, key=lambda r: r["id"])
+
+
+# =================================================
+# AVAILABILITY ENGINE
+# =================================================
+def slot_key(day, start):
+    """Id of a generated slot: '2026-02-07T10:15'."""
+    return f"{day}T{start}"
+
+
+def slots_between(conn, first, last=None, include_booked=False):
+    """
+    Everything offered from `first` to `last` (inclusive, open-ended
+    if None), sorted by date and time: stored slots plus every rule
+    slot that neither collides with one, nor was removed (a
+    slot_exceptions row), nor collides with an earlier rule's slot.
+
+    Stored slots keep their integer id; generated ones use slot_key().
+    Only stored rows can be booked, so with include_booked=False the
+    cost is the rule expansion plus the booked rows in range.
+    """
+    first = str(first)
+    stored = conn.execute("""
+        SELECT id, slot_date, start_time, end_time, is_booked
+        FROM slots
+        WHERE slot_date BETWEEN ? AND ?
+        ORDER BY slot_date, start_time, id
+    """, (first, str(last or "9999-12-31"))).fetchall()
+
+    by_day = {}
+    for r in stored:
+        by_day.setdefault(r["slot_date"], []).append(dict(r))
+
+    # sorted here rather than in SQL so the end_date index is used;
+    # on overlap the older rule wins
+    rules = [
+        rule_schedule(r) for r in sorted(conn.execute("""
+            SELECT * FROM slot_rules
+            WHERE end_date >= ? AND start_date <= ?
+        """, (first, str(last or "9999-12-31"))), key=lambda r: r["id"])
+    ]
+
+    if rules:
+        start = date.fromisoformat(first)
+        end = max(r["end_date"] for r in rules)
+        if last:
+            end = min(end, date.fromisoformat(str(last)))
+
+        removed = {
+            (r["slot_date"], r["start_time"]) for r in conn.execute("""
+                SELECT slot_date, start_time FROM slot_exceptions
+                WHERE slot_date BETWEEN ? AND ?
+            """, (first, end.isoformat()))
+        }
+
+        times = [day_times(r) for r in rules]
+        d = start
+        while d <= end:
+            day = d.isoformat()
+            taken = by_day.setdefault(day, [])
+            for rule, rule_times in zip(rules, times):
+                if not (rule["start_date"] <= d <= rule["end_date"]) \
+                        or d.weekday() not in rule["weekdays"] \
+                        or d in rule["holidays"]:
+                    continue
+                for s, e in rule_times:
+                    if (day, s) in removed:
+                        continue
+                    if any(x["start_time"] < e and s < x["end_time"] for x in taken):
+                        continue
+                    taken.append({
+                        "id": slot_key(day, s), "slot_date": day,
+                        "start_time": s, "end_time": e, "is_booked": 0,
+                    })
+            d += timedelta(days=1)
+
+    slots = []
+    for day in sorted(by_day):
+        for s in sorted(by_day[day], key=lambda x: (x["start_time"], str(x["id"]))):
+            if include_booked or not s["is_booked"]:
+                slots.append(s)
+    return slots
+
+
+def materialize_slot(conn, key, today=None):
+    """
+    Inside the booking transaction: if `key` is an open generated
+    slot, insert it into `slots` as booked and return the new row
+    (id, slot_date, start_time, end_time); otherwise None.
+    """
+    day, sep, start = str(key).partition("T")
+    if not sep or day < str(today or date.today()):
+        return None
+
+    slot = next((s for s in slots_between(conn, day, day) if s["id"] == key), None)
+    if slot is None:
+        return None
+
+    return conn.execute("""
+        INSERT INTO slots (slot_date, start_time, end_time, is_booked)
+        VALUES (?, ?, ?, 1)
+        RETURNING id, slot_date, start_time, end_time
+    """, (slot["slot_date"], slot["start_time"], slot["end_time"])).fetchone()
+
+
+def remove_slot(conn, day, start):
+    """Stop offering a generated slot (no commit)."""
+    conn.execute("""
+        INSERT OR IGNORE INTO slot_exceptions (slot_date, start_time)
+        VALUES (?, ?)
+    """, (day, start))
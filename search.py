@@ -0,0 +1,71 @@
+import threading
+
+# trigram FTS needs at least three characters to match anything
+MIN_FTS_TERM = 3
+
+_fts_lock = threading.Lock()
+_fts_available = None
+
+
+def fts_available(conn):
+    """True once migration 8 has built appointments_fts (SQLite >= 3.34)."""
+    global _fts_available
+    with _fts_lock:
+        if _fts_available is None:
+            _fts_available = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name='appointments_fts'"
+            ).fetchone() is not None
+        return _fts_available
+
+
+def fts_phrase(term):
+    """Quote user input as a single FTS5 phrase (no query syntax)."""
+    return '"' + term.replace('"', '""') + '"'
+
+
+def use_fts(conn, term):
+    return len(term.strip()) >= MIN_FTS_TERM and fts_available(conn)
+
+
+def search_clause(conn, term):
+    """
+    WHERE fragment and params matching `term` against name, mobile
+    and confirmation code. Uses the trigram index when it can and
+    falls back to LIKE for very short terms.
+    """
+    term = term.strip()
+    if use_fts(conn, term):
+        return (
+            " AND id IN (SELECT rowid FROM appointments_fts"
+            " WHERE appointments_fts MATCH ?)",
+            [fts_phrase(term)]
+        )
+
+    like = f"%{term}%"
+    return (
+        " AND (patient_name LIKE ? OR mobile LIKE ? OR confirmation_code LIKE ?)",
+        [like, like, like]
+    )
+
+
+def search_appointments(conn, term, limit=20):
+    """
+    Best matches first (bm25, code and mobile weighted above name).
+    """
+    term = term.strip()
+    if not use_fts(conn, term):
+        clause, params = search_clause(conn, term)
+        return conn.execute(
+            "SELECT * FROM appointments WHERE 1=1" + clause +
+            " ORDER BY appointment_date DESC LIMIT ?",
+            (*params, limit)
+        ).fetchall()
+
+    return conn.execute("""
+        SELECT a.*
+        FROM appointments_fts f
+        JOIN appointments a ON a.id = f.rowid
+        WHERE appointments_fts MATCH ?
+        ORDER BY bm25(appointments_fts, 1.0, 2.0, 4.0)
+        LIMIT ?
+    """, (fts_phrase(term), limit)).fetchall()
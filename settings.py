@@ -0,0 +1,144 @@
+import os
+import threading
+import time
+from dataclasses import dataclass, fields
+
+from database import pool
+
+# Updates made in this process invalidate immediately; other worker
+# processes notice the bumped `version` within the TTL, at the cost of
+# one primary-key lookup per TTL rather than a row read per request.
+SETTINGS_CACHE_TTL = float(os.environ.get("MEDBUDDY_SETTINGS_CACHE_TTL", "5"))
+
+
+def _int(value):
+    # the settings form posts strings; '' or NULL means not set
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+@dataclass(frozen=True)
+class Settings:
+    """The admin_settings row, typed. Immutable, so safe to share."""
+
+    version: int
+    doctor_whatsapp: str
+    upi_link: str
+    default_amount: int
+    followup_amount: int
+    default_meeting_link: str
+    reservation_message: str
+    confirmation_message: str
+    reminder_message: str
+
+    @classmethod
+    def from_row(cls, row):
+        values = {f.name: row[f.name] for f in fields(cls)}
+        for name in ("version", "default_amount", "followup_amount"):
+            values[name] = _int(values[name])
+        for name, value in values.items():
+            if value is None:
+                values[name] = ""
+        return cls(**values)
+
+    def __getitem__(self, key):
+        # row-style access, so helpers written for sqlite3.Row keep working
+        return getattr(self, key)
+
+
+class SettingsCache:
+    """
+    Process-wide Settings. Within the TTL no query is made; after it
+    the `version` column is compared and the row only re-read when an
+    update was committed somewhere.
+    """
+
+    def __init__(self, ttl=SETTINGS_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._settings = None
+        self._fresh_until = 0.0
+        self._generation = 0
+        self.hits = 0
+        self.revalidations = 0
+        self.misses = 0
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._settings = None
+
+    def get(self, conn=None):
+        """
+        Current Settings. `conn` is only used when the entry is stale;
+        without one a connection is borrowed from the pool.
+        """
+        with self._lock:
+            settings = self._settings
+            if settings is not None and self._fresh_until > time.monotonic():
+                self.hits += 1
+                return settings
+            generation = self._generation
+
+        if conn is None:
+            with pool.connection() as conn:
+                return self._refresh(conn, settings, generation)
+        return self._refresh(conn, settings, generation)
+
+    def _refresh(self, conn, settings, generation):
+        if settings is not None:
+            version = conn.execute(
+                "SELECT version FROM admin_settings WHERE id=1"
+            ).fetchone()["version"]
+            if version == settings.version:
+                self._store(settings, generation, "revalidations")
+                return settings
+
+        settings = Settings.from_row(conn.execute(
+            "SELECT * FROM admin_settings WHERE id=1"
+        ).fetchone())
+        self._store(settings, generation, "misses")
+        return settings
+
+    def _store(self, settings, generation, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+            # an update landed while we were reading: don't cache stale data
+            if self._generation == generation:
+                self._settings = settings
+                self._fresh_until = time.monotonic() + self.ttl
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "revalidations": self.revalidations,
+                "misses": self.misses,
+                "version": self._settings.version if self._settings else -1,
+            }
+
+
+settings_cache = SettingsCache()
+
+
+def update_settings(conn, values):
+    """
+    Apply the settings form and bump `version` (no commit). Call
+    settings_cache.invalidate() after committing.
+    """
+    conn.execute("""
+        UPDATE admin_settings
+        SET doctor_whatsapp=?,
+            upi_link=?,
+            default_amount=?,
+            followup_amount=?,
+            version=version + 1
+        WHERE id=1
+    """, (
+        values.get("doctor_whatsapp"),
+        values.get("upi_link"),
+        values.get("default_amount"),
+        values.get("followup_amount"),
+    ))
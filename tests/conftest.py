@@ -0,0 +1,68 @@
+import os
+import sys
+import tempfile
+
+# The app reads its configuration at import time: point everything at
+# a scratch directory before any module is imported.
+SCRATCH = tempfile.mkdtemp(prefix="medbuddy-tests-")
+os.environ.update(
+    MEDBUDDY_DB=os.path.join(SCRATCH, "medbuddy.db"),
+    MEDBUDDY_UPLOAD_FOLDER=os.path.join(SCRATCH, "uploads"),
+    MEDBUDDY_RECEIPT_CACHE_DIR=os.path.join(SCRATCH, "receipts"),
+    MEDBUDDY_SCHEDULER="off",
+    MEDBUDDY_PDF_WORKERS="0",
+    MEDBUDDY_EXPORT_WORKERS="0",
+)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import itertools  # noqa: E402
+
+import pytest  # noqa: E402
+
+from database import pool  # noqa: E402
+from init_db import migrate  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def migrated():
+    with pool.connection() as conn:
+        migrate(conn)
+
+
+@pytest.fixture
+def conn(migrated):
+    with pool.connection() as conn:
+        yield conn
+
+
+_codes = itertools.count(1)
+
+
+@pytest.fixture
+def add_appointment(conn):
+    """Insert an appointment row directly; returns its confirmation code."""
+    def add(appointment_date="2099-06-01", status="RESERVED", **fields):
+        code = fields.pop("confirmation_code", f"MB-TEST-{next(_codes):05d}")
+        row = {
+            "confirmation_code": code,
+            "patient_name": "Test Patient",
+            "mobile": "9000000000",
+            "address": "x",
+            "slot_id": 0,
+            "appointment_date": appointment_date,
+            "slot_time": "10:00-10:15",
+            "starts_at": f"{appointment_date}T10:00:00",
+            "consultation_type": "FIRST",
+            "amount": 500,
+            "status": status,
+            "created_at": f"{appointment_date}T08:00:00",
+            "updated_at": f"{appointment_date}T08:00:00",
+            **fields,
+        }
+        conn.execute(
+            f"INSERT INTO appointments ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})",
+            list(row.values())
+        )
+        conn.commit()
+        return code
+    return add
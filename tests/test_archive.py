@@ -0,0 +1,60 @@
+import os
+
+from archive import archive_appointments, archive_slots
+from uploads import UPLOAD_FOLDER, find_report
+
+DAY = "2001-01-05"
+CUTOFF = "2001-02-01"
+
+
+def stats(conn):
+    return {
+        (r["status"], r["n"])
+        for r in conn.execute(
+            "SELECT status, n FROM appointment_stats WHERE appointment_date = ?", (DAY,)
+        )
+    }
+
+
+def test_archived_rows_stay_visible(conn, add_appointment):
+    codes = [add_appointment(DAY, status=status) for status in ("DONE", "DONE", "CANCELLED")]
+    path = os.path.join(UPLOAD_FOLDER, "ar", "ch", "archived.pdf")
+    conn.execute("""
+        INSERT INTO medical_reports (confirmation_code, appointment_id, file_name,
+                                     file_path, sha256, size_bytes, uploaded_at)
+        VALUES (?, 0, 'scan.pdf', ?, 'abc', 3, ?)
+    """, (codes[0], path, f"{DAY}T09:00:00"))
+    conn.execute("""
+        INSERT INTO slots (slot_date, start_time, end_time, is_booked)
+        VALUES (?, '09:00', '09:15', 1), (?, '09:15', '09:30', 0)
+    """, (DAY, DAY))
+    conn.commit()
+    before = stats(conn)
+    assert before == {("DONE", 2), ("CANCELLED", 1)}
+
+    result = archive_appointments(conn, CUTOFF, batch_size=2)
+    assert result["appointments"] == 3
+    assert result["reports"] == 1
+    assert result["batches"] == 2
+    slots = archive_slots(conn, CUTOFF)
+    assert (slots["slots"], slots["dropped"]) == (1, 1)
+
+    marks = ",".join("?" * len(codes))
+    assert conn.execute(
+        f"SELECT COUNT(*) FROM appointments WHERE confirmation_code IN ({marks})", codes
+    ).fetchone()[0] == 0
+    assert {
+        r["confirmation_code"] for r in conn.execute(
+            f"SELECT confirmation_code FROM appointments_all WHERE confirmation_code IN ({marks})",
+            codes
+        )
+    } == set(codes)
+
+    report = find_report(conn, os.path.join("ar", "ch", "archived.pdf"))
+    assert report["file_name"] == "scan.pdf"
+
+    # archiving is not cancelling: the dashboard still counts them
+    assert stats(conn) == before
+    assert conn.execute(
+        "SELECT COUNT(*) FROM slots_archive WHERE slot_date = ?", (DAY,)
+    ).fetchone()[0] == 1
@@ -0,0 +1,32 @@
+import asyncio
+
+from asgi import application, fold_cookies
+
+
+def call(path, headers=()):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http", "method": "GET", "path": path, "query_string": b"",
+        "http_version": "1.1", "root_path": "", "headers": list(headers),
+    }
+    asyncio.run(application(scope, receive, send))
+    return sent[0]["status"], b"".join(m.get("body", b"") for m in sent[1:])
+
+
+def test_repeated_cookies_fold_with_semicolons():
+    scope = fold_cookies({"headers": [(b"cookie", b"a=1"), (b"accept", b"x"), (b"cookie", b"b=2")]})
+    assert scope["headers"] == [(b"accept", b"x"), (b"cookie", b"a=1; b=2")]
+
+
+def test_flask_views_run_through_the_bridge(migrated):
+    status, body = call("/slots")
+    assert status == 200
+    assert body.startswith(b"[")
+    assert application.pending == 0
@@ -0,0 +1,78 @@
+import threading
+from collections import Counter
+
+import pytest
+
+from booking import reserve_slot, SlotUnavailable
+from database import pool
+from schedules import parse_schedule, save_rule, slot_key
+
+DAY = "2099-03-02"
+THREADS = 24
+
+
+def test_concurrent_bookings_never_double_book(conn):
+    stored = [
+        conn.execute("""
+            INSERT INTO slots (slot_date, start_time, end_time, is_booked)
+            VALUES (?, ?, ?, 0) RETURNING id
+        """, (DAY, start, end)).fetchone()["id"]
+        for start, end in (("09:00", "09:15"), ("09:15", "09:30"), ("09:30", "09:45"))
+    ]
+    # generated slots are materialized by the booking itself
+    save_rule(conn, parse_schedule({
+        "start_date": DAY, "end_date": DAY, "weekdays": "0,1,2,3,4,5,6",
+        "window_start": "10:00", "window_end": "10:30", "slot_minutes": "15",
+    }))
+    conn.commit()
+    targets = [str(i) for i in stored] + [slot_key(DAY, "10:00"), slot_key(DAY, "10:15")]
+
+    start = threading.Barrier(THREADS)
+    outcomes = Counter()
+
+    def book(n):
+        target = targets[n % len(targets)]
+        start.wait()
+        with pool.connection() as c:
+            try:
+                reserve_slot(c, target, f"Patient {n}", f"90000{n:05d}", "x")
+                outcomes[target] += 1
+            except SlotUnavailable:
+                pass
+
+    threads = [threading.Thread(target=book, args=(n,)) for n in range(THREADS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert outcomes == Counter({t: 1 for t in targets})
+
+    appointments = conn.execute("""
+        SELECT slot_id, COUNT(*) AS n FROM appointments
+        WHERE appointment_date = ? GROUP BY slot_id
+    """, (DAY,)).fetchall()
+    assert len(appointments) == len(targets)
+    assert all(r["n"] == 1 for r in appointments)
+
+    booked = {r["slot_id"] for r in appointments}
+    for slot in conn.execute("SELECT id, is_booked FROM slots WHERE slot_date = ?", (DAY,)):
+        assert slot["is_booked"] == (slot["id"] in booked)
+
+
+def test_failed_message_rolls_back_the_booking(conn):
+    slot_id = conn.execute("""
+        INSERT INTO slots (slot_date, start_time, end_time, is_booked)
+        VALUES (?, '11:00', '11:15', 0) RETURNING id
+    """, (DAY,)).fetchone()["id"]
+    conn.commit()
+
+    def broken_outbox(c, appointment):
+        assert appointment["slot_id"] == slot_id
+        raise RuntimeError("outbox down")
+
+    with pytest.raises(RuntimeError):
+        reserve_slot(conn, str(slot_id), "A", "9000000000", "x", on_reserved=broken_outbox)
+
+    assert conn.execute("SELECT is_booked FROM slots WHERE id=?", (slot_id,)).fetchone()[0] == 0
+    assert conn.execute("SELECT 1 FROM appointments WHERE slot_id=?", (slot_id,)).fetchone() is None
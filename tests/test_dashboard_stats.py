@@ -0,0 +1,43 @@
+DAYS = ("2099-09-01", "2099-09-02")
+
+
+def counters(conn):
+    materialized = {
+        (r["appointment_date"], r["status"]): r["n"]
+        for r in conn.execute(
+            "SELECT appointment_date, status, n FROM appointment_stats "
+            "WHERE appointment_date IN (?, ?)", DAYS
+        )
+    }
+    live = {
+        (r["appointment_date"], r["status"]): r["n"]
+        for r in conn.execute(
+            "SELECT appointment_date, status, COUNT(*) AS n FROM appointments "
+            "WHERE appointment_date IN (?, ?) GROUP BY appointment_date, status", DAYS
+        )
+    }
+    return materialized, live
+
+
+def test_trigger_counters_match_a_live_group_by(conn, add_appointment):
+    codes = [add_appointment(DAYS[n % 2]) for n in range(6)]
+    materialized, live = counters(conn)
+    assert materialized == live == {(DAYS[0], "RESERVED"): 3, (DAYS[1], "RESERVED"): 3}
+
+    conn.execute("UPDATE appointments SET status = 'CONFIRMED' WHERE confirmation_code IN (?, ?)",
+                 codes[:2])
+    conn.execute("UPDATE appointments SET status = 'CANCELLED', appointment_date = ? "
+                 "WHERE confirmation_code = ?", (DAYS[1], codes[2]))
+    conn.execute("UPDATE appointments SET patient_name = 'Renamed' WHERE confirmation_code = ?",
+                 (codes[3],))
+    conn.commit()
+    materialized, live = counters(conn)
+    assert materialized == live
+
+    conn.execute("DELETE FROM appointments WHERE confirmation_code IN (?, ?, ?)",
+                 (codes[0], codes[2], codes[4]))
+    conn.commit()
+    materialized, live = counters(conn)
+    assert materialized == live
+    # emptied (day, status) rows are removed, not left at zero
+    assert 0 not in materialized.values()
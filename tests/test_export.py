@@ -0,0 +1,28 @@
+import io
+import zipfile
+
+from app import app
+
+
+def exported(query):
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s["admin"] = True
+    response = client.get(f"/admin/receipts/export?{query}")
+    assert response.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(response.data)) as zf:
+        return {name[:-len(".pdf")] for name in zf.namelist()}
+
+
+def test_export_honours_the_dashboard_filters(add_appointment):
+    day = "2099-07-01"
+    asha = add_appointment(day, patient_name="Asha Exportova", mobile="9111100001")
+    asha_followup = add_appointment(day, patient_name="Asha Exportova", mobile="9111100001",
+                                    consultation_type="FOLLOWUP")
+    other = add_appointment(day, patient_name="Ravi Unrelated", mobile="9222200002")
+
+    dates = f"from_date={day}&to_date={day}"
+    assert exported(dates) == {asha, asha_followup, other}
+    assert exported(f"search=Exportova&{dates}") == {asha, asha_followup}
+    assert exported(f"search=Exportova&consultation_type=FOLLOWUP&{dates}") == {asha_followup}
+    assert exported(f"search=9222200002&{dates}") == {other}
@@ -0,0 +1,54 @@
+import app as app_module
+from app import app
+from database import pool
+from metrics import TimedCursor, render, statement_label
+
+
+def admin_client():
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s["admin"] = True
+    return client
+
+
+def test_pooled_connection_execute_is_timed(migrated):
+    with pool.connection() as conn:
+        assert isinstance(conn.execute("SELECT 1"), TimedCursor)
+
+
+def test_slots_query_shows_up_in_metrics(migrated):
+    client = admin_client()
+    assert client.get("/slots").status_code == 200
+
+    lines = client.get("/metrics").get_data(as_text=True).splitlines()
+    assert any(
+        line.startswith('medbuddy_db_query_duration_seconds_count{statement="SELECT')
+        and "FROM slots" in line
+        for line in lines
+    )
+
+
+def test_metrics_are_closed_by_default(migrated, monkeypatch):
+    client = app.test_client()
+    assert client.get("/metrics").status_code == 403
+
+    monkeypatch.setattr(app_module, "METRICS_TOKEN", "s3cret")
+    assert client.get("/metrics", headers={"Authorization": "Bearer nope"}).status_code == 403
+    assert client.get("/metrics", headers={"Authorization": "Bearer s3cret"}).status_code == 200
+
+    monkeypatch.setattr(app_module, "METRICS_PUBLIC", True)
+    assert client.get("/metrics").status_code == 200
+
+
+def test_migrations_share_one_label(migrated):
+    assert statement_label("CREATE INDEX IF NOT EXISTS idx_x ON slots(slot_date)") == "ddl"
+    assert statement_label("  drop view if exists v") == "ddl"
+    assert statement_label("SELECT created_at FROM t") != "ddl"
+
+    statements = {
+        line.split('statement="', 1)[1].split('"', 1)[0]
+        for line in render().splitlines()
+        if line.startswith("medbuddy_db_query_duration_seconds_count{")
+    }
+    assert "ddl" in statements
+    assert not any(s.upper().startswith(("CREATE", "DROP", "ALTER")) for s in statements)
@@ -0,0 +1,19 @@
+from init_db import full_scans
+
+
+def test_hot_queries_use_an_index(conn):
+    assert full_scans(conn) == {}
+
+
+def test_covering_index_scan_counts_as_full_scan(conn):
+    queries = {
+        "unindexed": ("SELECT * FROM appointments WHERE patient_name=?", ("x",)),
+        "covering": ("SELECT COUNT(*) FROM slots WHERE slot_date LIKE ?", ("%",)),
+    }
+    assert set(full_scans(conn, queries)) == {"unindexed", "covering"}
+
+
+def test_open_slots_partial_index_is_gone(conn):
+    assert conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_slots_open'"
+    ).fetchone() is None
@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+
+from scheduler import LeaderLease, auto_expire_reserved
+
+
+def expire(conn, name):
+    conn.execute(
+        "UPDATE scheduler_lease SET expires_at = '2000-01-01T00:00:00' WHERE name = ?", (name,)
+    )
+    conn.commit()
+
+
+def test_lease_is_held_until_it_expires(conn):
+    first = LeaderLease("test-expiry", lease=timedelta(minutes=5))
+    second = LeaderLease("test-expiry", lease=timedelta(minutes=5))
+
+    assert first.acquire()
+    assert not second.acquire()
+    assert first.acquire()          # renewal
+    assert not second.acquire()
+
+    expire(conn, "test-expiry")
+    assert second.acquire()         # takeover
+    assert not first.acquire()      # the old holder has lost it
+    owner = conn.execute(
+        "SELECT owner FROM scheduler_lease WHERE name = 'test-expiry'"
+    ).fetchone()["owner"]
+    assert owner == second.owner
+
+
+def test_release_hands_the_lease_over(conn):
+    first = LeaderLease("test-release")
+    second = LeaderLease("test-release")
+
+    assert first.acquire()
+    second.release()                # not the holder: no effect
+    assert not second.acquire()
+
+    first.release()
+    assert second.acquire()
+
+
+def test_leases_are_independent_by_name(conn):
+    assert LeaderLease("test-name-a").acquire()
+    assert LeaderLease("test-name-b").acquire()
+
+
+def test_expiry_frees_stale_reservations_in_batches(conn, add_appointment):
+    def booked_slot(start):
+        return conn.execute("""
+            INSERT INTO slots (slot_date, start_time, end_time, is_booked)
+            VALUES ('2099-08-01', ?, ?, 1) RETURNING id
+        """, (start, start)).fetchone()["id"]
+
+    stale = {
+        add_appointment("2099-08-01", slot_id=booked_slot(f"09:0{n}"),
+                        created_at=f"2000-01-01T08:0{n}:00"): n
+        for n in range(5)
+    }
+    fresh = add_appointment("2099-08-01", slot_id=booked_slot("10:00"),
+                            created_at=datetime.now().isoformat())
+    confirmed = add_appointment("2099-08-01", status="CONFIRMED", slot_id=booked_slot("11:00"),
+                                created_at="2000-01-01T08:00:00")
+
+    result = auto_expire_reserved(batch_size=2)
+    assert result["expired"] >= 5
+    assert result["batches"] >= 3
+
+    rows = {
+        r["confirmation_code"]: r
+        for r in conn.execute("""
+            SELECT a.confirmation_code, a.status, s.is_booked
+            FROM appointments a JOIN slots s ON s.id = a.slot_id
+            WHERE a.appointment_date = '2099-08-01'
+        """)
+    }
+    for code in stale:
+        assert (rows[code]["status"], rows[code]["is_booked"]) == ("CANCELLED", 0)
+    assert (rows[fresh]["status"], rows[fresh]["is_booked"]) == ("RESERVED", 1)
+    assert (rows[confirmed]["status"], rows[confirmed]["is_booked"]) == ("CONFIRMED", 1)
@@ -0,0 +1,135 @@
+import pytest
+
+from app import app
+from schedules import (
+    ScheduleError, parse_schedule, day_times, save_rule, rule_schedule,
+    slots_between, materialize_slot, remove_slot, slot_key
+)
+
+TODAY = "2099-01-01"
+
+
+def schedule(day, window_start="09:00", window_end="10:00", minutes=20, **extra):
+    return parse_schedule({
+        "start_date": day, "end_date": day, "weekdays": "0,1,2,3,4,5,6",
+        "window_start": window_start, "window_end": window_end,
+        "slot_minutes": str(minutes), **extra,
+    })
+
+
+def add_rule(conn, day, **kwargs):
+    rule_id = save_rule(conn, schedule(day, **kwargs))
+    conn.commit()
+    return rule_id
+
+
+# ---- parse_schedule ----
+@pytest.mark.parametrize("minutes", ["1440", "1470", "61", "4", "x"])
+def test_parse_rejects_bad_slot_lengths(minutes):
+    with pytest.raises(ScheduleError):
+        schedule("2099-04-01", minutes=minutes)
+
+
+def test_parse_rejects_inverted_window_and_dates():
+    with pytest.raises(ScheduleError):
+        schedule("2099-04-01", window_start="10:00", window_end="09:00")
+    with pytest.raises(ScheduleError):
+        parse_schedule({"start_date": "2099-04-02", "end_date": "2099-04-01",
+                        "window_start": "09:00", "window_end": "10:00", "slot_minutes": "15"})
+
+
+def test_slot_filling_the_window_is_allowed():
+    assert day_times(schedule("2099-04-01", minutes=60)) == [("09:00", "10:00")]
+
+
+def test_day_times_stop_at_window_end_and_skip_breaks():
+    assert day_times(schedule("2099-04-01", minutes=25)) == [("09:00", "09:25"), ("09:25", "09:50")]
+    assert day_times(schedule("2099-04-01", window_end="11:00", minutes=30,
+                              breaks="09:45-10:15")) == [
+        ("09:00", "09:30"), ("10:15", "10:45"),
+    ]
+
+
+def test_saved_rule_round_trips(conn):
+    rule_id = add_rule(conn, "2099-04-02", window_end="17:00", minutes=90)
+    row = conn.execute("SELECT * FROM slot_rules WHERE id=?", (rule_id,)).fetchone()
+    assert row["slot_minutes"] == 90
+    assert rule_schedule(row) == schedule("2099-04-02", window_end="17:00", minutes=90)
+
+
+def test_zero_length_rule_offers_nothing(conn):
+    conn.execute("""
+        INSERT INTO slot_rules (start_date, end_date, weekdays, window_start,
+                                window_end, slot_minutes, breaks, holidays, created_at)
+        VALUES ('2099-04-03', '2099-04-03', 127, '09:00', '10:00', 0, '', '', 'x')
+    """)
+    conn.commit()
+    assert slots_between(conn, "2099-04-03", "2099-04-03") == []
+
+
+# ---- slots_between ----
+def starts(slots):
+    return [s["start_time"] for s in slots]
+
+
+def test_older_rule_wins_on_overlap(conn):
+    day = "2099-04-10"
+    add_rule(conn, day, minutes=30)                           # 09:00, 09:30
+    add_rule(conn, day, window_start="09:15", window_end="10:30", minutes=15)
+    # the second rule only fills what the first leaves free
+    assert starts(slots_between(conn, day, day)) == ["09:00", "09:30", "10:00", "10:15"]
+
+
+def test_stored_slot_and_removed_slot_hide_rule_slots(conn):
+    day = "2099-04-11"
+    add_rule(conn, day, minutes=20)                           # 09:00, 09:20, 09:40
+    conn.execute("""
+        INSERT INTO slots (slot_date, start_time, end_time, is_booked)
+        VALUES (?, '09:10', '09:30', 1)
+    """, (day,))
+    remove_slot(conn, day, "09:40")
+    conn.commit()
+
+    assert slots_between(conn, day, day) == []
+    booked = slots_between(conn, day, day, include_booked=True)
+    assert [(s["start_time"], s["is_booked"]) for s in booked] == [("09:10", 1)]
+
+
+# ---- materialize_slot ----
+def test_materialize_books_a_generated_slot_once(conn):
+    day = "2099-04-12"
+    add_rule(conn, day, minutes=30)
+
+    row = materialize_slot(conn, slot_key(day, "09:30"), today=TODAY)
+    assert (row["slot_date"], row["start_time"], row["end_time"]) == (day, "09:30", "10:00")
+    assert materialize_slot(conn, slot_key(day, "09:30"), today=TODAY) is None
+    conn.commit()
+    assert starts(slots_between(conn, day, day)) == ["09:00"]
+
+
+def test_materialize_refuses_unknown_removed_and_past_slots(conn):
+    day = "2099-04-13"
+    add_rule(conn, day, minutes=30)
+    remove_slot(conn, day, "09:00")
+    conn.commit()
+
+    assert materialize_slot(conn, slot_key(day, "09:00"), today=TODAY) is None
+    assert materialize_slot(conn, slot_key(day, "09:10"), today=TODAY) is None
+    assert materialize_slot(conn, "not-a-key", today=TODAY) is None
+    assert materialize_slot(conn, slot_key(day, "09:30"), today="2099-05-01") is None
+
+
+# ---- admin slot paging ----
+def test_slot_page_cursor_must_start_with_a_date(migrated):
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s["admin"] = True
+
+    first = client.get("/admin/slots/page?page_size=1")
+    assert first.status_code == 200
+
+    for cursor in ("not-a-date,09:00,1", "2099-13-40,09:00,1"):
+        assert client.get(f"/admin/slots/page?after={cursor}").status_code == 400
+        assert client.get(f"/admin/dashboard?after={cursor}").status_code == 400
+
+    assert client.get("/admin/slots/page?after=2099-01-01,09:00,1").status_code == 200
@@ -0,0 +1,34 @@
+import json
+
+from app import app
+
+DAY = "2099-10-01"
+
+
+def test_slots_etag_revalidates_until_a_booking(conn):
+    slot_id = conn.execute("""
+        INSERT INTO slots (slot_date, start_time, end_time, is_booked)
+        VALUES (?, '09:00', '09:15', 0) RETURNING id
+    """, (DAY,)).fetchone()["id"]
+    conn.commit()
+    client = app.test_client()
+
+    first = client.get("/slots")
+    etag = first.headers["ETag"]
+    assert first.status_code == 200
+    assert slot_id in {s["id"] for s in json.loads(first.data)}
+
+    unchanged = client.get("/slots", headers={"If-None-Match": etag})
+    assert unchanged.status_code == 304
+    assert unchanged.data == b""
+
+    booked = client.post("/book", data={
+        "slot_id": str(slot_id), "patient_name": "Etag Patient",
+        "mobile": "9333300003", "address": "x",
+    })
+    assert booked.status_code == 302
+
+    after = client.get("/slots", headers={"If-None-Match": etag})
+    assert after.status_code == 200
+    assert after.headers["ETag"] != etag
+    assert slot_id not in {s["id"] for s in json.loads(after.data)}
@@ -0,0 +1,59 @@
+import pytest
+
+from app import app
+from availability import (
+    SlotEvents, StreamsFull, slot_cache, slot_events, slots_claimed, stream_events
+)
+
+DAY = "2099-04-01"
+
+
+def test_delta_advances_the_stream_etag(conn):
+    slot_id = conn.execute("""
+        INSERT INTO slots (slot_date, start_time, end_time, is_booked)
+        VALUES (?, '09:00', '09:15', 0) RETURNING id
+    """, (DAY,)).fetchone()["id"]
+    conn.commit()
+    slot_cache.invalidate()
+
+    q = slot_events.subscribe()
+    stream = stream_events(q, heartbeat=0.05, lifetime=60)
+    try:
+        assert next(stream).startswith("event: snapshot")
+
+        conn.execute("UPDATE slots SET is_booked = 1 WHERE id = ?", (slot_id,))
+        conn.commit()
+        slots_claimed(conn, slot_id)
+
+        assert next(stream) == f'event: slot-claimed\ndata: [{{"id":{slot_id}}}]\n\n'
+        # the client has the change already: no snapshot at the heartbeat
+        assert next(stream) == ": ping\n\n"
+    finally:
+        stream.close()
+    assert q not in slot_events._subscribers
+
+
+def test_stream_ends_after_its_lifetime(migrated):
+    q = slot_events.subscribe()
+    messages = list(stream_events(q, heartbeat=0.01, lifetime=0.05))
+    assert messages[0].startswith("event: snapshot")
+    assert slot_events.count() == 0
+
+
+def test_subscribers_are_capped():
+    events = SlotEvents(limit=1)
+    q = events.subscribe()
+    with pytest.raises(StreamsFull):
+        events.subscribe()
+    events.unsubscribe(q)
+    events.subscribe()
+
+
+def test_stream_route_answers_503_when_off_or_full(migrated, monkeypatch):
+    client = app.test_client()
+    monkeypatch.setitem(app.config, "SLOT_STREAM", False)
+    assert client.get("/slots/stream").status_code == 503
+
+    monkeypatch.setitem(app.config, "SLOT_STREAM", True)
+    monkeypatch.setattr(slot_events, "limit", 0)
+    assert client.get("/slots/stream").status_code == 503
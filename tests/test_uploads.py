@@ -0,0 +1,64 @@
+import io
+import os
+import threading
+
+import pytest
+from werkzeug.exceptions import RequestEntityTooLarge
+
+import app as app_module
+from app import app
+from uploads import UPLOAD_FOLDER, HashingSpool
+
+SPOOL_DIR = os.path.join(UPLOAD_FOLDER, "tmp")
+
+
+def parts():
+    return [n for n in os.listdir(SPOOL_DIR) if n.endswith(".part")] \
+        if os.path.isdir(SPOOL_DIR) else []
+
+
+def upload(code, data, name="report.pdf"):
+    return app.test_client().post(
+        f"/upload/{code}",
+        data={"report": (io.BytesIO(data), name)},
+        content_type="multipart/form-data",
+    )
+
+
+def test_oversized_spool_removes_its_part_file():
+    spool = HashingSpool(SPOOL_DIR, limit=10)
+    spool.write(b"x" * 10)
+    with pytest.raises(RequestEntityTooLarge):
+        spool.write(b"x")
+    assert not os.path.exists(spool.path)
+
+
+def test_rejected_upload_leaves_no_part_files(add_appointment):
+    code = add_appointment()
+    response = upload(code, b"x" * (app.config["MAX_CONTENT_LENGTH"] + 1))
+    assert response.status_code == 413
+    assert parts() == []
+
+
+def test_quota_holds_under_parallel_uploads(add_appointment, conn, monkeypatch):
+    monkeypatch.setattr(app_module, "MAX_APPOINTMENT_FILES", 2)
+    code = add_appointment()
+    start = threading.Barrier(6)
+    statuses = []
+
+    def send(n):
+        start.wait()
+        statuses.append(upload(code, f"report {n}".encode()).status_code)
+
+    threads = [threading.Thread(target=send, args=(n,)) for n in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert statuses == [200] * 6
+    stored = conn.execute(
+        "SELECT COUNT(*) FROM medical_reports WHERE confirmation_code=?", (code,)
+    ).fetchone()[0]
+    assert stored == 2
+    assert parts() == []
@@ -0,0 +1,170 @@
+import hashlib
+import mimetypes
+import os
+import tempfile
+
+from flask import Request, Response, send_from_directory
+from werkzeug.exceptions import RequestEntityTooLarge
+
+UPLOAD_FOLDER = os.environ.get("MEDBUDDY_UPLOAD_FOLDER", "uploads")
+
+MAX_FILE_BYTES = int(os.environ.get("MEDBUDDY_MAX_FILE_MB", "10")) * 1024 * 1024
+MAX_APPOINTMENT_BYTES = int(os.environ.get("MEDBUDDY_MAX_APPOINTMENT_MB", "50")) * 1024 * 1024
+MAX_APPOINTMENT_FILES = int(os.environ.get("MEDBUDDY_MAX_APPOINTMENT_FILES", "20"))
+
+ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg', 'doc', 'docx'}
+
+# "" serves files from Python (sendfile via wsgi.file_wrapper where the
+# server supports it), "nginx" hands off with X-Accel-Redirect,
+# "apache" with X-Sendfile.
+SENDFILE_MODE = os.environ.get("MEDBUDDY_SENDFILE", "")
+NGINX_UPLOADS_PREFIX = os.environ.get("MEDBUDDY_NGINX_UPLOADS", "/protected-uploads/")
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+def allowed_file(filename):
+    return '.' in filename and \
+           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+
+# ---------------- STREAMING SPOOL ----------------
+class HashingSpool:
+    """
+    Writable file the multipart parser streams an upload into.
+
+    Chunks go straight to a temp file next to the final storage
+    (so storing is a rename) while the SHA-256 is computed on the
+    fly. Writing past `limit` aborts the request with 413. The temp
+    file is removed on close unless it was stored.
+    """
+
+    def __init__(self, directory, limit=MAX_FILE_BYTES):
+        os.makedirs(directory, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(dir=directory, suffix=".part")
+        self._fh = os.fdopen(fd, "w+b")
+        self._sha256 = hashlib.sha256()
+        self.size = 0
+        self.limit = limit
+        self.stored = False
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.limit:
+            # the parser drops the spool on error: remove the .part now
+            self.close()
+            raise RequestEntityTooLarge(
+                f"File is larger than {self.limit // (1024 * 1024)} MB"
+            )
+        self._sha256.update(data)
+        return self._fh.write(data)
+
+    @property
+    def sha256(self):
+        return self._sha256.hexdigest()
+
+    def close(self):
+        self._fh.close()
+        if not self.stored and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __getattr__(self, name):
+        # read / seek / tell / flush for FileStorage
+        return getattr(self._fh, name)
+
+
+class UploadRequest(Request):
+    """Flask request whose uploaded files are HashingSpools."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._spools = []
+
+    def _get_file_stream(self, total_content_length, content_type,
+                         filename=None, content_length=None):
+        spool = HashingSpool(os.path.join(UPLOAD_FOLDER, "tmp"))
+        self._spools.append(spool)
+        return spool
+
+    def close(self):
+        # Flask closes the request on teardown; this also catches
+        # spools from a body the parser gave up on (MAX_CONTENT_LENGTH)
+        super().close()
+        for spool in self._spools:
+            spool.close()
+
+
+# ---------------- CONTENT-ADDRESSED STORE ----------------
+def content_path(sha256, ext, root=UPLOAD_FOLDER):
+    """uploads/ab/cd/abcd....pdf — two levels keep directories small."""
+    return os.path.join(root, sha256[:2], sha256[2:4], f"{sha256}.{ext}")
+
+
+def store_spool(spool, ext, root=UPLOAD_FOLDER):
+    """
+    Move a finished spool to its content address. Identical files
+    are kept once: if the address exists the spool is discarded.
+    Returns the stored path.
+    """
+    path = content_path(spool.sha256, ext, root)
+    spool.flush()
+
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(spool.path, path)
+        spool.stored = True
+
+    return path
+
+
+def appointment_usage(conn, code):
+    """(files, bytes) already uploaded for this appointment."""
+    row = conn.execute("""
+        SELECT COUNT(*), COALESCE(SUM(size_bytes), 0)
+        FROM medical_reports
+        WHERE confirmation_code=?
+    """, (code,)).fetchone()
+    return row[0], row[1]
+
+
+# ---------------- SERVING ----------------
+def find_report(conn, filename, root=UPLOAD_FOLDER):
+    """The medical_reports row for uploads/<filename>, or None."""
+    return conn.execute("""
+        SELECT file_name, sha256
+        FROM medical_reports_all
+        WHERE file_path=?
+        LIMIT 1
+    """, (os.path.join(root, filename),)).fetchone()
+
+
+def report_response(report, filename, root=UPLOAD_FOLDER):
+    """
+    Conditional, range-capable response for a stored report.
+    Content-addressed files never change, so they get a strong
+    sha256 ETag and a year-long immutable cache lifetime; legacy
+    files fall back to Last-Modified revalidation.
+    """
+    if SENDFILE_MODE == "nginx":
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        response = Response(mimetype=mimetype)
+        response.headers["X-Accel-Redirect"] = NGINX_UPLOADS_PREFIX + filename
+    else:
+        # safe_join inside send_from_directory rejects traversal
+        response = send_from_directory(
+            os.path.abspath(root),
+            filename,
+            download_name=report["file_name"],
+            etag=report["sha256"] or True,
+            conditional=True,
+        )
+
+    response.cache_control.private = True
+    if report["sha256"]:
+        response.cache_control.no_cache = None
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+
+    return response